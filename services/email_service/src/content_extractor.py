@@ -1,12 +1,50 @@
 import base64
 import logging
+import re
 from typing import Dict, Any, Tuple, List, Optional
 from shared.utils.text_utils import html_to_text
 from .interfaces.email_processor import IContentExtractor
 from shared.exceptions import EmailProcessingError, ValidationError
 
+# pybase64 decodes with SIMD kernels, several times faster than the stdlib on
+# multi-kilobyte bodies; fall back to the stdlib when it is not installed
+try:
+    from pybase64 import urlsafe_b64decode
+except ImportError:
+    from base64 import urlsafe_b64decode
+
 logger = logging.getLogger(__name__)
 
+_CHARSET_RE = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+
+
+def _part_charset(part: Dict[str, Any]) -> str:
+    """
+    Get the charset declared in a MIME part's Content-Type header.
+    
+    Args:
+        part: Gmail API message part
+        
+    Returns:
+        Declared charset, or 'utf-8' if none is declared
+    """
+    for header in part.get('headers', ()):
+        if header.get('name', '').lower() == 'content-type':
+            match = _CHARSET_RE.search(header.get('value', ''))
+            if match:
+                return match.group(1)
+            break
+    return 'utf-8'
+
+
+def _decode_text(raw: bytes, charset: str) -> str:
+    """Decode body bytes with the part's charset, falling back to UTF-8 for unknown charsets."""
+    try:
+        return raw.decode(charset, errors='replace')
+    except LookupError:
+        logger.warning(f"Unknown charset '{charset}', decoding as utf-8")
+        return raw.decode('utf-8', errors='replace')
+
 class EmailContentExtractor(IContentExtractor):
     """
     Extracts and processes email content from Gmail API message payloads.
@@ -41,53 +79,39 @@ class EmailContentExtractor(IContentExtractor):
         body_text = ""
         
         try:
-            # Check for body in the main payload
-            if 'body' in payload and 'data' in payload['body']:
-                data = payload['body']['data']
-                try:
-                    decoded_data = base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
-                except (UnicodeDecodeError, ValueError, base64.binascii.Error) as e:
-                    logger.warning(f"Error decoding main body part data: {e}")
-                    decoded_data = ""  # Fallback to empty string
+            # Walk the MIME tree depth-first in document order with an explicit
+            # stack; the first HTML and first plain-text part win, so stop as
+            # soon as both are found.
+            stack = [payload]
+            while stack and not (body_html and body_text):
+                node = stack.pop()
                 
-                if payload.get('mimeType') == 'text/html':
-                    body_html = decoded_data
-                elif payload.get('mimeType') == 'text/plain':
-                    body_text = decoded_data
-            
-            # Check for body in parts
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    part_mime_type = part.get('mimeType', '')
-                    
-                    # Skip parts that are attachments (identified by filename)
-                    if part.get('filename'):
-                        continue
-                        
-                    if 'body' in part and 'data' in part['body']:
-                        data = part['body']['data']
-                        try:
-                            decoded_data = base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
-                        except (UnicodeDecodeError, ValueError, base64.binascii.Error) as e:
-                            logger.warning(f"Error decoding part data (mime: {part_mime_type}): {e}")
-                            decoded_data = ""  # Fallback
-                        
-                        if part_mime_type == 'text/html' and not body_html:  # Prioritize first HTML part found
-                            body_html = decoded_data
-                        elif part_mime_type == 'text/plain' and not body_text:  # Prioritize first text part found
-                            body_text = decoded_data
+                # Skip parts that are attachments (identified by filename)
+                if node is not payload and node.get('filename'):
+                    continue
+                
+                mime_type = node.get('mimeType', '')
+                data = (node.get('body') or {}).get('data')
+                if data and (
+                    (mime_type == 'text/html' and not body_html) or
+                    (mime_type == 'text/plain' and not body_text)
+                ):
+                    try:
+                        raw = urlsafe_b64decode(data)
+                    except (ValueError, base64.binascii.Error) as e:
+                        logger.warning(f"Error decoding body part data (mime: {mime_type}): {e}")
+                        raw = b""  # Fallback to empty string
+                    # Gmail keeps the original encoding (often iso-8859-1 or
+                    # windows-1252), so honor the part's declared charset
+                    decoded_data = _decode_text(raw, _part_charset(node))
                     
-                    # Recursively check for nested parts (e.g., multipart/alternative)
-                    if 'parts' in part:
-                        try:
-                            nested_html, nested_text = self.extract_body(part)
-                            if nested_html and not body_html:
-                                body_html = nested_html
-                            if nested_text and not body_text:
-                                body_text = nested_text
-                        except (ValidationError, EmailProcessingError) as e:
-                            # Log but continue with other parts if one nested part fails
-                            logger.warning(f"Error extracting nested part: {e}")
+                    if mime_type == 'text/html':
+                        body_html = decoded_data
+                    else:
+                        body_text = decoded_data
+                
+                # Push children reversed so they are visited in order
+                stack.extend(reversed(node.get('parts', ())))
             
             # If we only have HTML, try to extract text from it
             if body_html and not body_text:
@@ -129,40 +153,22 @@ class EmailContentExtractor(IContentExtractor):
         try:
             attachments = []
             
-            # Check for attachments in the main payload (less common but possible)
-            if ('body' in payload and 'attachmentId' in payload['body'] and
-                    payload.get('filename', '')):
-                attachments.append({
-                    'id': payload['body']['attachmentId'],
-                    'filename': payload.get('filename', 'unknown_filename'),
-                    'mime_type': payload.get('mimeType', 'application/octet-stream'),
-                    'size': payload['body'].get('size', 0)
-                })
-            
-            # Check for attachments in parts (standard way)
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    # If this part has an attachmentId and filename, it's an attachment
-                    if ('body' in part and 'attachmentId' in part['body'] and
-                            part.get('filename', '')):
-                        try:
-                            attachments.append({
-                                'id': part['body']['attachmentId'],
-                                'filename': part.get('filename', 'unknown_filename'),
-                                'mime_type': part.get('mimeType', 'application/octet-stream'),
-                                'size': part['body'].get('size', 0)
-                            })
-                        except Exception as e:
-                            logger.warning(f"Error processing attachment metadata: {e}. Skipping attachment.")
-                    
-                    # Recursively check for nested parts (e.g., multipart/mixed)
-                    if 'parts' in part:
-                        try:
-                            nested_attachments = self.get_attachments(part)
-                            attachments.extend(nested_attachments)
-                        except (ValidationError, EmailProcessingError) as e:
-                            # Log but continue with other parts if one nested part fails
-                            logger.warning(f"Error extracting nested attachments: {e}")
+            # Walk the MIME tree depth-first in document order; any node with an
+            # attachmentId and a filename is an attachment
+            stack = [payload]
+            while stack:
+                node = stack.pop()
+                body = node.get('body') or {}
+                if 'attachmentId' in body and node.get('filename', ''):
+                    attachments.append({
+                        'id': body['attachmentId'],
+                        'filename': node.get('filename', 'unknown_filename'),
+                        'mime_type': node.get('mimeType', 'application/octet-stream'),
+                        'size': body.get('size', 0)
+                    })
+                
+                # Push children reversed so they are visited in order
+                stack.extend(reversed(node.get('parts', ())))
             
             return attachments
             
@@ -1,4 +1,5 @@
 import logging
+import sys
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 import email.utils
@@ -6,24 +7,45 @@ from shared.models.email import EmailMessage, EmailAttachment, EmailAddress
 from .interfaces.email_processor import IContentExtractor, IEmailNormalizer
 from shared.exceptions import EmailProcessingError, ValidationError
 
+try:
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
 logger = logging.getLogger(__name__)
 
+# Headers read into EmailMessage fields, keyed by lowercase name
+NORMALIZED_HEADERS = {
+    'from': 'From',
+    'to': 'To',
+    'cc': 'Cc',
+    'bcc': 'Bcc',
+    'date': 'Date',
+    'subject': 'Subject',
+}
+
 class EmailNormalizer(IEmailNormalizer):
     """
     Normalizes Gmail API email data into a standard internal format.
     
     This class converts raw Gmail API email data into our internal
     EmailMessage model for consistent processing across the system.
+    
+    Every header is already decoded into typed fields, so the raw header
+    map is only attached as raw_data when keep_raw is set; it otherwise
+    doubles the size of each message held in memory and published.
     """
     
-    def __init__(self, content_extractor: IContentExtractor):
+    def __init__(self, content_extractor: IContentExtractor, keep_raw: bool = False):
         """
         Initialize the normalizer with a content extractor.
         
         Args:
             content_extractor: Component that extracts content from message payloads
+            keep_raw: Attach the raw header map as raw_data (default: False)
         """
         self.content_extractor = content_extractor
+        self.keep_raw = keep_raw
     
     async def normalize_message(self, user_id: str, message_data: dict) -> Optional[EmailMessage]:
         """
@@ -89,7 +111,11 @@ class EmailNormalizer(IEmailNormalizer):
             thread_id = raw_message.get('threadId', '')
             
             # Get headers (as dictionary for easier access)
-            headers = self._get_headers_dict(raw_message)
+            # Gmail messages often carry dozens of headers; unless the raw map
+            # is kept, only collect the ones copied into EmailMessage fields
+            headers = self._get_headers_dict(
+                raw_message, None if self.keep_raw else NORMALIZED_HEADERS
+            )
             
             # Get from, to, cc, bcc information
             try:
@@ -137,8 +163,9 @@ class EmailNormalizer(IEmailNormalizer):
                     html_content = ""
                     text_content = f"[Error extracting email content: {e}]"
             
-            # Get labels
-            labels = raw_message.get('labelIds', [])
+            # Get labels, interned so the handful of label ids shared by every
+            # message (INBOX, UNREAD, ...) are stored once across a batch
+            labels = [sys.intern(label) for label in raw_message.get('labelIds', [])]
             
             # Get attachment metadata
             try:
@@ -159,14 +186,14 @@ class EmailNormalizer(IEmailNormalizer):
                 cc_addresses=cc_addresses,
                 bcc_addresses=bcc_addresses,
                 html_content=html_content or None,  # Convert empty string to None
-                text_content=text_content or "(No content)",  # Provide placeholder if empty
+                text_content=text_content or raw_message.get('snippet') or "(No content)",  # Metadata-only messages fall back to the snippet
                 labels=labels,
                 attachments=attachments,
                 raw_data={
                     'message_id': message_id,
                     'thread_id': thread_id,
                     'headers': headers,
-                }
+                } if self.keep_raw else None
             )
             
             return email_message
@@ -216,12 +243,19 @@ class EmailNormalizer(IEmailNormalizer):
         
         return normalized_messages
     
-    def _get_headers_dict(self, message: Dict[str, Any]) -> Dict[str, str]:
+    def _get_headers_dict(
+        self,
+        message: Dict[str, Any],
+        wanted: Optional[Dict[str, str]] = None
+    ) -> Dict[str, str]:
         """
         Convert Gmail API's headers list to a dictionary for easier access.
         
         Args:
             message: Raw message from Gmail API
+            wanted: Map of lowercase header names to the canonical names to
+                store them under; other headers are skipped (default: None,
+                keep every header under its original name)
             
         Returns:
             Dictionary of headers
@@ -231,7 +265,14 @@ class EmailNormalizer(IEmailNormalizer):
         if 'payload' in message and 'headers' in message['payload']:
             for header in message['payload']['headers']:
                 if 'name' in header and 'value' in header:
-                    headers[header['name']] = header['value']
+                    name = header['name']
+                    if wanted is not None:
+                        name = wanted.get(name.lower())
+                        if name is None:
+                            continue
+                    else:
+                        name = sys.intern(name)
+                    headers[name] = header['value']
         
         return headers
     
@@ -299,6 +340,9 @@ class EmailNormalizer(IEmailNormalizer):
         """
         Parse an email date string into a datetime object.
         
+        ISO 8601 dates are parsed with ciso8601 when it is installed; RFC 2822
+        dates (and ISO dates without ciso8601) go through email.utils.
+        
         Args:
             date_string: Email date string
             
@@ -308,6 +352,17 @@ class EmailNormalizer(IEmailNormalizer):
         if not date_string:
             return None
         
+        # RFC 2822 dates start with a weekday or day name, ISO dates with the year
+        if ciso8601 is not None and date_string[:1].isdigit():
+            try:
+                parsed = ciso8601.parse_datetime(date_string)
+            except ValueError:
+                parsed = None
+            if parsed is not None:
+                if parsed.tzinfo is not None:
+                    return datetime.fromtimestamp(parsed.timestamp())
+                return parsed
+        
         try:
             # Parse RFC 2822 date format
             time_tuple = email.utils.parsedate_tz(date_string)
@@ -315,7 +370,7 @@ class EmailNormalizer(IEmailNormalizer):
                 # Convert to datetime with timezone adjustment
                 timestamp = email.utils.mktime_tz(time_tuple)
                 return datetime.fromtimestamp(timestamp)
-        except Exception as e:
+        except (TypeError, ValueError, OverflowError) as e:
             logger.warning(f"Error parsing date '{date_string}': {e}")
         
         return None
@@ -341,7 +396,7 @@ class EmailNormalizer(IEmailNormalizer):
                     id=meta['id'],
                     message_id=message_id,
                     filename=meta['filename'],
-                    mime_type=meta['mime_type'],
+                    mime_type=sys.intern(meta['mime_type']),
                     size=meta['size']
                 )
                 for meta in attachment_metadata
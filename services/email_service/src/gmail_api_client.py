@@ -1,12 +1,19 @@
 import asyncio
+import importlib.util
 import logging
-from typing import List, Dict, Any, Optional, Tuple, AsyncGenerator
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta
+import httplib2
+import httpx
+from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
 from .rate_limiter import TokenBucketRateLimiter
 from .auth_utils import convert_token_to_credentials
-from shared.utils.retry import async_retry_on_rate_limit
+from shared.utils.retry import async_retry_on_rate_limit, is_rate_limit_response, parse_retry_after
+from shared.utils.lru_cache import LRUCache
 from .interfaces.email_fetcher import IEmailFetcher
 from shared.exceptions import (
     AuthenticationError,
@@ -17,15 +24,86 @@ from shared.exceptions import (
     GmailAutomationError
 )
 import base64
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from pybase64 import urlsafe_b64decode
+except ImportError:
+    from base64 import urlsafe_b64decode
 
 logger = logging.getLogger(__name__)
 
+# Gmail's batch endpoint accepts at most 100 sub-requests per HTTP call
+GMAIL_BATCH_LIMIT = 100
+
+# messages.list returns at most 500 message stubs per page
+GMAIL_LIST_PAGE_LIMIT = 500
+
+# Partial response mask for messages.list; only the stubs and cursor are read
+LIST_FIELDS = 'messages(id,threadId),nextPageToken'
+
+# Partial response mask for history.list; only added messages are read
+HISTORY_FIELDS = 'history(messagesAdded(message(id,threadId,labelIds))),nextPageToken'
+
+# Labels whose messages messages.list leaves out unless includeSpamTrash is set
+HIDDEN_LABELS = frozenset({'SPAM', 'TRASH'})
+
+# Built services are reused for this long (seconds) when credentials carry no
+# expiry, and never closer than SERVICE_EXPIRY_MARGIN to a known expiry
+SERVICE_CACHE_TTL = 300
+SERVICE_EXPIRY_MARGIN = timedelta(seconds=60)
+
+# Headers requested when fetching messages with format=metadata
+METADATA_HEADERS = ['From', 'To', 'Cc', 'Bcc', 'Subject', 'Date', 'Message-ID']
+
+# REST endpoint used for calls made directly over httpx
+GMAIL_API_BASE_URL = 'https://gmail.googleapis.com/gmail/v1/users/me'
+
+# httpx only negotiates HTTP/2 when the optional h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+def _message_get_kwargs(detail_level: str) -> Dict[str, Any]:
+    """Build the messages.get format arguments for a detail level."""
+    if detail_level == 'metadata':
+        return {'format': 'metadata', 'metadataHeaders': METADATA_HEADERS}
+    return {'format': 'full'}
+
+
+# Full messages carry base64 bodies, so JSON parsing is a real CPU cost;
+# orjson parses them several times faster than the stdlib when installed
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+
+class OrjsonModel(JsonModel):
+    """googleapiclient response model that parses JSON bodies with orjson."""
+    
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Match JsonModel, which hands back undecodable bodies as text
+            return content.decode('utf-8') if isinstance(content, bytes) else content
+        if self._data_wrapper and isinstance(body, dict) and 'data' in body:
+            body = body['data']
+        return body
+
+
 class GmailApiClient(IEmailFetcher):
     """
     Client for direct interactions with the Gmail API.
     
     This class handles all low-level API calls to the Gmail API, including
     authentication, rate limiting, and API error handling.
+    
+    Message listing goes straight to the REST endpoint over a shared
+    httpx.AsyncClient, so pages are fetched without blocking the event loop
+    and reuse pooled (HTTP/2 when available) connections. Call aclose() to
+    release them.
     """
     
     def __init__(
@@ -34,7 +112,8 @@ class GmailApiClient(IEmailFetcher):
         rate_limiter: TokenBucketRateLimiter,
         batch_size: int = 100,
         max_retries: int = 5,
-        retry_delay: int = 1
+        retry_delay: int = 1,
+        http_client: Optional[httpx.AsyncClient] = None
     ):
         """
         Initialize the Gmail API client.
@@ -45,12 +124,37 @@ class GmailApiClient(IEmailFetcher):
             batch_size: Number of emails to fetch per request (default: 100)
             max_retries: Maximum number of retries for rate limited requests (default: 5)
             retry_delay: Base delay in seconds between retries (default: 1)
+            http_client: HTTP client for direct REST calls (default: created on first use)
         """
         self.auth_client = auth_client
         self.rate_limiter = rate_limiter
         self.batch_size = batch_size
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        # user_id -> (service, credentials); build() parses the discovery
+        # document and creates a new resource tree, so reuse it across calls
+        self._service_cache = LRUCache(maxsize=1024, ttl=SERVICE_CACHE_TTL)
+        self._http = http_client
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """
+        Get the shared HTTP client, creating it on first use.
+        
+        Returns:
+            Pooled httpx.AsyncClient for Gmail REST calls
+        """
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+            )
+        return self._http
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and its pooled connections."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
     
     async def get_credentials(self, user_id: str):
         """
@@ -90,28 +194,103 @@ class GmailApiClient(IEmailFetcher):
             logger.error(f"Unexpected error getting credentials for user {user_id}: {e}")
             raise GmailAutomationError(f"Unexpected error preparing credentials for user {user_id}: {e}") from e
     
+    async def _choose_batch_size(self, cost_per_item: int, limit: int) -> int:
+        """
+        Size the next request to the rate limiter's current headroom.
+        
+        Returns at most ``limit`` items, fewer when the token bucket cannot
+        cover them, and waits for a refill when not even one item fits. This
+        keeps bulk fetches just under the quota instead of overshooting it and
+        backing off on userRateLimitExceeded errors.
+        
+        Args:
+            cost_per_item: Tokens consumed per item in the request
+            limit: Largest batch size the caller wants
+            
+        Returns:
+            Number of items to put in the next request (at least 1)
+        """
+        available = await self.rate_limiter.available_tokens()
+        if available < cost_per_item:
+            logger.info(f"Rate limiter exhausted, waiting for {cost_per_item} tokens")
+            await self.rate_limiter.wait_for_tokens(cost_per_item)
+            available = await self.rate_limiter.available_tokens()
+        return max(1, min(limit, available // cost_per_item))
+    
     async def get_gmail_service(self, user_id: str):
         """
         Get an authenticated Gmail API service instance.
         
+        Services are cached per user and rebuilt once the credentials are
+        about to expire, after SERVICE_CACHE_TTL, or after an auth error.
+        
         Args:
             user_id: The user ID to get the service for
             
         Returns:
             Authenticated Gmail API service
         """
+        service, _ = await self._get_service_and_credentials(user_id)
+        return service
+    
+    def invalidate_service(self, user_id: str) -> None:
+        """
+        Drop the cached Gmail service for a user so the next call rebuilds it.
+        
+        Args:
+            user_id: The user ID whose service should be discarded
+        """
+        self._service_cache.pop(user_id)
+    
+    async def _get_service_and_credentials(self, user_id: str):
+        """Return a (service, credentials) pair for a user, building it if needed."""
+        cached = self._service_cache.get(user_id)
+        if cached is not None:
+            expiry = getattr(cached[1], 'expiry', None)
+            if not isinstance(expiry, datetime) or expiry - datetime.utcnow() > SERVICE_EXPIRY_MARGIN:
+                return cached
+        
         credentials = await self.get_credentials(user_id)
         try:
-            return build('gmail', 'v1', credentials=credentials)
+            service = build(
+                'gmail', 'v1', credentials=credentials,
+                model=OrjsonModel() if orjson is not None else None
+            )
         except Exception as e:
             # Errors during build are usually configuration or library issues
             logger.error(f"Failed to build Gmail service for user {user_id}: {e}")
             raise ConfigurationError(f"Failed to initialize Gmail API client: {e}") from e
+        
+        self._service_cache.set(user_id, (service, credentials))
+        return service, credentials
+    
+    async def _get_access_token(self, user_id: str) -> str:
+        """
+        Get a valid OAuth access token for direct REST calls.
+        
+        Args:
+            user_id: The user ID to get the token for
+            
+        Returns:
+            Bearer access token
+        """
+        _, credentials = await self._get_service_and_credentials(user_id)
+        if not credentials.valid and getattr(credentials, 'refresh_token', None):
+            # google-auth refreshes synchronously, so keep it off the event loop
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, credentials.refresh, Request())
+            except Exception as e:
+                logger.warning(f"Failed to refresh Gmail token for user {user_id}: {e}")
+                self.invalidate_service(user_id)
+                raise AuthenticationError(f"Failed to refresh Gmail token for user {user_id}: {e}") from e
+        return credentials.token
     
     # Apply retry decorator to handle rate limiting
     @async_retry_on_rate_limit(max_retries=5, base_delay=1)
     async def get_email_list(
-        self, user_id: str, query: str = "", max_results: int = 100
+        self, user_id: str, query: str = "", max_results: int = 100,
+        page_token: Optional[str] = None
     ) -> Tuple[List[dict], Optional[str]]:
         """
         Fetches a list of email message IDs and thread IDs matching the query.
@@ -119,58 +298,145 @@ class GmailApiClient(IEmailFetcher):
         Args:
             user_id: The user ID to fetch emails for
             query: Gmail search query string (default: "")
-            max_results: Maximum number of results to return (default: 100)
+            max_results: Maximum number of results to return (default: 100,
+                capped at GMAIL_LIST_PAGE_LIMIT)
+            page_token: Token of the page to fetch, None for the first page
             
         Returns:
             A tuple containing:
             - List of email message/thread IDs matching the query
             - Next page token for pagination (or None if no more pages)
         """
-        try:
-            service = await self.get_gmail_service(user_id)
-        except (ConfigurationError, AuthenticationError, ExternalServiceError) as e:
-             # Propagate errors from getting the service
-             raise e
-             
-        # For test mocking simplicity, we'll just get the first page
+        params = {'maxResults': min(max_results, GMAIL_LIST_PAGE_LIMIT), 'fields': LIST_FIELDS}
+        if query:
+            params['q'] = query
+        if page_token:
+            params['pageToken'] = page_token
+        
+        data = await self._get_json(user_id, 'messages', params, 'fetching email list')
+        if data is None:
+            return [], None # Treat as no more messages found
+        return data.get('messages', []), data.get('nextPageToken')
+    
+    @async_retry_on_rate_limit(max_retries=5, base_delay=1)
+    async def list_history(
+        self, user_id: str, start_history_id: str, max_results: int = GMAIL_LIST_PAGE_LIMIT,
+        page_token: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Fetches the messages added to the mailbox after a history ID.
+        
+        Messages labelled SPAM or TRASH are left out, as messages.list does
+        by default.
+        
+        Args:
+            user_id: The user ID to fetch changes for
+            start_history_id: History ID to list changes after
+            max_results: Maximum number of history records per page (default:
+                GMAIL_LIST_PAGE_LIMIT)
+            page_token: Token of the page to fetch, None for the first page
+            
+        Returns:
+            A tuple containing:
+            - List of added message stubs (id, threadId, labelIds)
+            - Next page token for pagination (or None if no more pages)
+            
+        Raises:
+            ResourceNotFoundError: If Gmail no longer keeps history that far
+                back (typically after about a week)
+        """
+        params = {
+            'startHistoryId': start_history_id,
+            'historyTypes': 'messageAdded',
+            'maxResults': min(max_results, GMAIL_LIST_PAGE_LIMIT),
+            'fields': HISTORY_FIELDS,
+        }
+        if page_token:
+            params['pageToken'] = page_token
+        
+        data = await self._get_json(user_id, 'history', params, 'listing mailbox history')
+        if data is None:
+            raise ResourceNotFoundError(f"History {start_history_id} is no longer available for user {user_id}")
+        
+        messages = [
+            added['message']
+            for record in data.get('history', [])
+            for added in record.get('messagesAdded', [])
+            if not HIDDEN_LABELS.intersection(added['message'].get('labelIds', ()))
+        ]
+        return messages, data.get('nextPageToken')
+    
+    @async_retry_on_rate_limit(max_retries=5, base_delay=1)
+    async def get_history_id(self, user_id: str) -> str:
+        """
+        Fetches the mailbox's current history ID from the user's profile.
+        
+        Args:
+            user_id: The user ID to fetch the history ID for
+            
+        Returns:
+            Current Gmail history ID
+        """
+        data = await self._get_json(user_id, 'profile', {'fields': 'historyId'}, 'fetching profile')
+        if not data or 'historyId' not in data:
+            raise ExternalServiceError(f"Gmail API returned no history ID for user {user_id}")
+        return data['historyId']
+    
+    async def _get_json(
+        self, user_id: str, path: str, params: Dict[str, Any], action: str
+    ) -> Optional[dict]:
+        """
+        Issue a GET against the Gmail REST API and parse the JSON response.
+        
+        Args:
+            user_id: The user ID to authenticate as
+            path: Path below GMAIL_API_BASE_URL
+            params: Query parameters
+            action: Description of the call for logs and error messages
+            
+        Returns:
+            Parsed response body, or None if Gmail answered 404
+        """
+        token = await self._get_access_token(user_id)
+        
         await self.rate_limiter.acquire_tokens(1)
         try:
-            request = service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=max_results,
-                pageToken=None
+            response = await self._get_http_client().get(
+                f"{GMAIL_API_BASE_URL}/{path}",
+                params=params,
+                headers={'Authorization': f'Bearer {token}'}
             )
-            response = request.execute()
-            messages = response.get('messages', [])
-            next_page_token = response.get('nextPageToken')
-            
-            # Return the messages and the next page token
-            return messages, next_page_token
-            
-        except HttpError as error:
-            # Map HttpError to custom exceptions
-            if error.resp.status == 401 or error.resp.status == 403:
-                logger.warning(f"Authentication/Authorization error fetching email list for user {user_id}: {error}")
-                raise AuthenticationError(f"Gmail API permission error for user {user_id}: {error}") from error
-            elif error.resp.status == 404:
-                logger.info(f"Resource not found (e.g., user mailbox) fetching email list for user {user_id}: {error}")
-                # Depending on context, might be ResourceNotFoundError or just return empty
-                return [], None # Treat as no more messages found
-            elif error.resp.status == 429:
-                logger.warning(f"Rate limit hit fetching email list for user {user_id}: {error}")
-                # Let the retry decorator handle this, but raise RateLimitError if retries fail
-                raise RateLimitError("Gmail API rate limit exceeded") from error 
-            else:
-                logger.error(f"HTTP error fetching email list for user {user_id}: {error}")
-                raise ExternalServiceError(f"Gmail API error fetching email list: {error}") from error
-        except Exception as e:
-            logger.error(f"Unexpected error fetching email list page for user {user_id}: {e}")
-            raise GmailAutomationError(f"Unexpected error during email list fetch: {e}") from e
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP error {action} for user {user_id}: {e}")
+            raise ExternalServiceError(f"Gmail API error {action}: {e}") from e
+        
+        # Map HTTP errors to custom exceptions
+        if is_rate_limit_response(response.status_code, response.content):
+            logger.warning(f"Rate limit hit {action} for user {user_id}: {response.text}")
+            raise RateLimitError(
+                "Gmail API rate limit exceeded",
+                retry_after=parse_retry_after(response.headers.get('retry-after'))
+            )
+        elif response.status_code in (401, 403):
+            logger.warning(f"Authentication/Authorization error {action} for user {user_id}: {response.text}")
+            self.invalidate_service(user_id)
+            raise AuthenticationError(f"Gmail API permission error for user {user_id}: {response.text}")
+        elif response.status_code == 404:
+            logger.info(f"Resource not found {action} for user {user_id}: {response.text}")
+            return None
+        elif response.is_error:
+            logger.error(f"HTTP error {action} for user {user_id}: {response.status_code} {response.text}")
+            raise ExternalServiceError(f"Gmail API error {action}: {response.status_code} {response.text}")
+        
+        try:
+            return _json_loads(response.content)
+        except ValueError as e:
+            logger.error(f"Invalid response {action} for user {user_id}: {e}")
+            raise ExternalServiceError(f"Gmail API returned an invalid response {action}: {e}") from e
 
     @async_retry_on_rate_limit(max_retries=5, base_delay=1)
     async def get_email_details(
-        self, user_id: str, message_id: str
+        self, user_id: str, message_id: str, detail_level: str = 'full'
     ) -> Optional[dict]:
         """
         Fetches the detailed content of a specific email message.
@@ -178,30 +444,37 @@ class GmailApiClient(IEmailFetcher):
         Args:
             user_id: The user ID to fetch the email for
             message_id: The Gmail message ID
+            detail_level: 'full' for the complete payload, or 'metadata' for
+                just METADATA_HEADERS, labels and snippet (default: 'full')
             
         Returns:
-            Dict containing the full email details or None on error.
+            Dict containing the email details or None on error.
         """
+        # Every attempt reaches Gmail, so retries are charged too
         await self.rate_limiter.acquire_tokens(1)
         try:
             service = await self.get_gmail_service(user_id)
             request = service.users().messages().get(
                 userId='me', 
                 id=message_id,
-                format='full'
+                **_message_get_kwargs(detail_level)
             )
             return request.execute()
         except HttpError as error:
-            if error.resp.status == 401 or error.resp.status == 403:
+            if is_rate_limit_response(error.resp.status, error.content):
+                logger.warning(f"Rate limit hit fetching details for message {message_id} (user {user_id}): {error}")
+                raise RateLimitError(
+                    "Gmail API rate limit exceeded",
+                    retry_after=parse_retry_after(error.resp.get('retry-after'))
+                ) from error
+            elif error.resp.status == 401 or error.resp.status == 403:
                 logger.warning(f"Authentication/Authorization error fetching details for message {message_id} (user {user_id}): {error}")
+                self.invalidate_service(user_id)
                 raise AuthenticationError(f"Gmail API permission error for message {message_id}: {error}") from error
             elif error.resp.status == 404:
                 logger.warning(f"Message {message_id} not found for user {user_id}: {error}")
                 # Raise ResourceNotFoundError for a specific message not found
                 raise ResourceNotFoundError(f"Gmail message {message_id} not found.") from error
-            elif error.resp.status == 429:
-                logger.warning(f"Rate limit hit fetching details for message {message_id} (user {user_id}): {error}")
-                raise RateLimitError("Gmail API rate limit exceeded") from error
             else:
                 logger.error(f"HTTP error fetching details for message {message_id} (user {user_id}): {error}")
                 raise ExternalServiceError(f"Gmail API error fetching message details: {error}") from error
@@ -212,15 +485,118 @@ class GmailApiClient(IEmailFetcher):
             logger.error(f"Unexpected error fetching details for message {message_id} (user {user_id}): {e}")
             raise GmailAutomationError(f"Unexpected error fetching message details: {e}") from e
 
-    @async_retry_on_rate_limit(max_retries=5, base_delay=1)
-    async def get_emails_batch(
-        self, user_id: str, message_ids: List[str]
-    ) -> AsyncGenerator[Optional[dict], None]:
-        """Fetches details for a batch of email messages asynchronously."""
-        tasks = [self.get_email_details(user_id, msg_id) for msg_id in message_ids]
-        results = await asyncio.gather(*tasks)
-        for result in results:
-            yield result
+    async def get_email_details_batch(
+        self, user_id: str, message_ids: List[str], batch_size: int = GMAIL_BATCH_LIMIT,
+        detail_level: str = 'full'
+    ) -> List[Optional[dict]]:
+        """
+        Fetches the detailed content of many email messages using Gmail's batch endpoint.
+        
+        Up to ``batch_size`` (max 100) ``messages.get`` calls are sent in a single
+        HTTP request, so N messages cost ceil(N / batch_size) round trips instead of N.
+        Batches shrink when the rate limiter is low on tokens.
+        
+        Rate limits are not retried here: the caller owns the backoff. The
+        RateLimitError carries the messages fetched before the limit was hit
+        in details['messages'], so a retry only needs to request the rest.
+        
+        Args:
+            user_id: The user ID to fetch the emails for
+            message_ids: The Gmail message IDs to fetch
+            batch_size: Number of sub-requests per batch call (default: 100)
+            detail_level: 'full' for complete payloads, or 'metadata' for just
+                METADATA_HEADERS, labels and snippet without body parts (default: 'full')
+            
+        Returns:
+            List of message dicts in the same order as message_ids, with None
+            for messages that could not be fetched.
+            
+        Raises:
+            RateLimitError: If Gmail rate limited the batch or any message in it
+            AuthenticationError: If Gmail rejected the credentials for any message
+        """
+        if not message_ids:
+            return []
+        
+        batch_size = max(1, min(batch_size, GMAIL_BATCH_LIMIT))
+        # Batch request IDs must be unique, so fetch each message only once
+        unique_ids = list(dict.fromkeys(message_ids))
+        results: Dict[str, Optional[dict]] = {}
+        auth_errors: List[Exception] = []
+        rate_limit_errors: List[Exception] = []
+        
+        def _on_response(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+                return
+            # Quota errors also use 403, so rate limits are told apart first
+            status = getattr(getattr(exception, 'resp', None), 'status', None)
+            if status is not None and is_rate_limit_response(status, getattr(exception, 'content', None)):
+                rate_limit_errors.append(exception)
+            elif status in (401, 403):
+                auth_errors.append(exception)
+            else:
+                logger.warning(f"Failed to fetch message {request_id} in batch (user {user_id}): {exception}")
+        
+        get_kwargs = _message_get_kwargs(detail_level)
+        
+        service, credentials = await self._get_service_and_credentials(user_id)
+        # httplib2 connections are not thread-safe and the cached service may be
+        # used by concurrent batches, so give this call its own connection
+        http = AuthorizedHttp(credentials, http=httplib2.Http())
+        loop = asyncio.get_running_loop()
+        
+        start = 0
+        while start < len(unique_ids):
+            chunk_size = await self._choose_batch_size(1, batch_size)
+            chunk = unique_ids[start:start + chunk_size]
+            start += len(chunk)
+            await self.rate_limiter.acquire_tokens(len(chunk))
+            try:
+                batch = service.new_batch_http_request(callback=_on_response)
+                for message_id in chunk:
+                    batch.add(
+                        service.users().messages().get(userId='me', id=message_id, **get_kwargs),
+                        request_id=message_id
+                    )
+                # The googleapiclient transport is blocking, so keep it off the event loop
+                await loop.run_in_executor(None, lambda: batch.execute(http=http))
+            except HttpError as error:
+                if is_rate_limit_response(error.resp.status, error.content):
+                    logger.warning(f"Rate limit hit fetching message batch (user {user_id}): {error}")
+                    raise RateLimitError(
+                        "Gmail API rate limit exceeded",
+                        details={'messages': results},
+                        retry_after=parse_retry_after(error.resp.get('retry-after'))
+                    ) from error
+                elif error.resp.status == 401 or error.resp.status == 403:
+                    logger.warning(f"Authentication/Authorization error fetching message batch (user {user_id}): {error}")
+                    self.invalidate_service(user_id)
+                    raise AuthenticationError(f"Gmail API permission error for user {user_id}: {error}") from error
+                else:
+                    logger.error(f"HTTP error fetching message batch (user {user_id}): {error}")
+                    raise ExternalServiceError(f"Gmail API error fetching message details: {error}") from error
+            except Exception as e:
+                logger.error(f"Unexpected error fetching message batch (user {user_id}): {e}")
+                raise GmailAutomationError(f"Unexpected error fetching message details: {e}") from e
+            
+            if auth_errors:
+                error = auth_errors[0]
+                logger.warning(f"Authentication/Authorization error in message batch (user {user_id}): {error}")
+                self.invalidate_service(user_id)
+                raise AuthenticationError(f"Gmail API permission error for user {user_id}: {error}") from error
+            if rate_limit_errors:
+                error = rate_limit_errors[0]
+                logger.warning(
+                    f"Rate limit hit for {len(rate_limit_errors)} messages in batch (user {user_id}): {error}"
+                )
+                raise RateLimitError(
+                    "Gmail API rate limit exceeded",
+                    details={'messages': results},
+                    retry_after=parse_retry_after(error.resp.get('retry-after'))
+                ) from error
+        
+        return [results.get(message_id) for message_id in message_ids]
 
     @async_retry_on_rate_limit(max_retries=5, base_delay=1)
     async def get_attachment(
@@ -253,18 +629,22 @@ class GmailApiClient(IEmailFetcher):
             if 'data' not in response:
                  logger.error(f"Attachment {attachment_id} for message {message_id} (user {user_id}) response missing 'data' field.")
                  raise ResourceNotFoundError(f"Attachment {attachment_id} data not found in response.")
-            data = base64.urlsafe_b64decode(response['data'])
+            data = urlsafe_b64decode(response['data'])
             return data
         except HttpError as error:
-            if error.resp.status == 401 or error.resp.status == 403:
+            if is_rate_limit_response(error.resp.status, error.content):
+                logger.warning(f"Rate limit hit fetching attachment {attachment_id} (user {user_id}): {error}")
+                raise RateLimitError(
+                    "Gmail API rate limit exceeded",
+                    retry_after=parse_retry_after(error.resp.get('retry-after'))
+                ) from error
+            elif error.resp.status == 401 or error.resp.status == 403:
                 logger.warning(f"Auth error fetching attachment {attachment_id} for msg {message_id} (user {user_id}): {error}")
+                self.invalidate_service(user_id)
                 raise AuthenticationError(f"Gmail API permission error for attachment {attachment_id}: {error}") from error
             elif error.resp.status == 404:
                 logger.warning(f"Attachment {attachment_id} not found for msg {message_id} (user {user_id}): {error}")
                 raise ResourceNotFoundError(f"Attachment {attachment_id} not found for message {message_id}.") from error
-            elif error.resp.status == 429:
-                logger.warning(f"Rate limit hit fetching attachment {attachment_id} (user {user_id}): {error}")
-                raise RateLimitError("Gmail API rate limit exceeded") from error
             else:
                 logger.error(f"HTTP error fetching attachment {attachment_id} (user {user_id}): {error}")
                 raise ExternalServiceError(f"Gmail API error fetching attachment: {error}") from error
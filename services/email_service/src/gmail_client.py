@@ -1,16 +1,19 @@
 import asyncio
 import logging
+from concurrent.futures import Executor
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, AsyncIterable, AsyncIterator, FrozenSet
 
+from shared.exceptions import RateLimitError
 from shared.models.email import EmailMessage
+from shared.utils.concurrency import gather_with_concurrency
+from shared.utils.lru_cache import LRUCache
 from .rate_limiter import TokenBucketRateLimiter
-from .gmail_api_client import GmailApiClient
-from .email_normalizer import EmailNormalizer
+from .gmail_api_client import GmailApiClient, GMAIL_BATCH_LIMIT
 from .content_extractor import EmailContentExtractor
 
 # Import interfaces
-from services.email_service.src.interfaces.email_fetcher import EmailFetcher
+from services.email_service.src.interfaces.email_fetcher import EmailFetcher, DetailLevel
 from services.email_service.src.interfaces.email_processor import EmailProcessor
 from services.email_service.src.interfaces.attachment_handler import AttachmentHandler
 
@@ -21,6 +24,18 @@ from services.email_service.src.providers.gmail_attachment_handler import GmailA
 
 logger = logging.getLogger(__name__)
 
+
+def _has_full_payload(message: Dict[str, Any]) -> bool:
+    """Check whether a message was fetched with format=full (metadata has no body)."""
+    payload = message.get('payload', {})
+    return 'body' in payload or 'parts' in payload
+
+
+def _has_headers(message: Dict[str, Any]) -> bool:
+    """Check whether a message was fetched with at least format=metadata."""
+    return 'headers' in message.get('payload', {})
+
+
 class GmailClient:
     """
     High-level client for working with Gmail API.
@@ -39,6 +54,7 @@ class GmailClient:
         email_processor: Component for processing and normalizing emails
         attachment_handler: Component for handling attachments
         batch_size: Number of emails to fetch per request
+        max_concurrency: Maximum number of detail batches fetched at once
     """
     
     def __init__(
@@ -48,6 +64,10 @@ class GmailClient:
         batch_size: int = 100,
         max_retries: int = 5,
         retry_delay: int = 1,
+        max_concurrency: int = 5,
+        normalize_executor: Optional[Executor] = None,
+        large_message_executor: Optional[Executor] = None,
+        keep_raw: bool = False,
         email_fetcher: Optional[EmailFetcher] = None,
         email_processor: Optional[EmailProcessor] = None,
         attachment_handler: Optional[AttachmentHandler] = None
@@ -61,6 +81,12 @@ class GmailClient:
             batch_size: Number of emails to fetch per request (default: 100)
             max_retries: Maximum number of retries for rate limited requests (default: 5)
             retry_delay: Base delay in seconds between retries (default: 1)
+            max_concurrency: Maximum number of detail batches fetched at once (default: 5)
+            normalize_executor: Executor for CPU-bound normalization, e.g. a
+                ProcessPoolExecutor (default: event loop's thread pool)
+            large_message_executor: Executor for normalizing large messages on
+                their own, e.g. a shared ProcessPoolExecutor (default: None)
+            keep_raw: Attach the raw header map to normalized messages (default: False)
             email_fetcher: Component for fetching emails (optional)
             email_processor: Component for processing emails (optional)
             attachment_handler: Component for handling attachments (optional)
@@ -78,17 +104,38 @@ class GmailClient:
         content_extractor = EmailContentExtractor()
         
         # Initialize components with default implementations if not provided
-        self.email_fetcher = email_fetcher or GmailEmailFetcher(api_client)
-        self.email_processor = email_processor or GmailEmailProcessor(content_extractor)
+        self.email_fetcher = email_fetcher or GmailEmailFetcher(api_client, page_size=batch_size)
+        self.email_processor = email_processor or GmailEmailProcessor(
+            content_extractor,
+            executor=normalize_executor,
+            large_message_executor=large_message_executor,
+            keep_raw=keep_raw
+        )
         self.attachment_handler = attachment_handler or GmailAttachmentHandler(api_client)
+        self.api_client = api_client
         
         self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        
+        # Detail-batch concurrency per user, adjusted AIMD-style: halved when
+        # Gmail rate limits one of the user's batches, raised by 0.5 per clean
+        # round. Gmail enforces its quota per user, so one user's rate limits
+        # never throttle another user's ingestion.
+        self._detail_concurrency: Dict[str, float] = {}
+        
+        # Normalized messages keyed by (user_id, message id, historyId, detail
+        # level); the pair of IDs identifies an immutable payload, so hits skip
+        # the parse
+        self.normalized_cache = LRUCache(maxsize=10_000)
     
     async def get_emails_since(
         self, 
         user_id: str, 
         since_date: datetime,
-        max_emails: int = 1000
+        max_emails: int = 1000,
+        detail_level: Optional[DetailLevel] = None
     ) -> List[Dict[str, Any]]:
         """
         Get all emails since a given date.
@@ -97,11 +144,13 @@ class GmailClient:
             user_id: The user ID to fetch emails for
             since_date: Fetch emails since this date
             max_emails: Maximum number of emails to fetch
+            detail_level: 'metadata' for headers only, 'full' for complete
+                payloads, or None for ID stubs only (default: None)
             
         Returns:
             List of email metadata
         """
-        return await self.email_fetcher.get_emails_since(user_id, since_date, max_emails)
+        return await self.email_fetcher.get_emails_since(user_id, since_date, max_emails, detail_level)
     
     async def get_all_emails(
         self,
@@ -124,34 +173,390 @@ class GmailClient:
         """
         return await self.email_fetcher.get_all_emails(user_id, max_emails)
     
+    def iter_emails_since(
+        self,
+        user_id: str,
+        since_date: datetime,
+        max_emails: int = 1000,
+        detail_level: Optional[DetailLevel] = None,
+        labels: Optional[FrozenSet[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream emails since a given date without collecting them into a list.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            since_date: Fetch emails since this date
+            max_emails: Maximum number of emails to yield
+            detail_level: 'metadata' for headers only, 'full' for complete
+                payloads, or None for ID stubs only (default: None)
+            labels: Only yield emails carrying any of these labels, or None
+                for all emails (default: None)
+            
+        Returns:
+            Async iterator of email metadata
+        """
+        return self.email_fetcher.iter_emails_since(user_id, since_date, max_emails, detail_level, labels)
+    
+    def iter_emails_since_history(
+        self,
+        user_id: str,
+        start_history_id: Optional[str],
+        since_date: datetime,
+        max_emails: int = 1000,
+        detail_level: Optional[DetailLevel] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream emails added after a mailbox history ID.
+        
+        Falls back to a date query from since_date when there is no history
+        ID or Gmail has expired it.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            start_history_id: History ID saved by the last completed sync, or None
+            since_date: Fetch emails since this date when falling back
+            max_emails: Maximum number of emails to yield from the date query
+            detail_level: 'metadata' for headers only, 'full' for complete
+                payloads, or None for ID stubs only (default: None)
+            
+        Returns:
+            Async iterator of email metadata
+        """
+        return self.email_fetcher.iter_emails_since_history(
+            user_id, start_history_id, since_date, max_emails, detail_level
+        )
+    
+    async def get_history_id(self, user_id: str) -> str:
+        """
+        Get the mailbox's current history ID.
+        
+        Args:
+            user_id: The user ID to get the history ID for
+            
+        Returns:
+            Current Gmail history ID
+        """
+        return await self.email_fetcher.get_history_id(user_id)
+    
+    def iter_all_emails(
+        self,
+        user_id: str,
+        max_emails: int = 100,
+        labels: Optional[FrozenSet[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream emails without date filtering or collecting them into a list.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            max_emails: Maximum number of emails to yield
+            labels: Only yield emails carrying any of these labels, or None
+                for all emails (default: None)
+            
+        Returns:
+            Async iterator of email metadata
+        """
+        return self.email_fetcher.iter_all_emails(user_id, max_emails, labels)
+    
+    async def iter_batches(
+        self,
+        messages: AsyncIterable[Dict[str, Any]],
+        batch_size: Optional[int] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Group a stream of Gmail API messages into lists.
+        
+        Each batch is yielded as soon as it is full, so only one batch is
+        held at a time however long the stream is.
+        
+        Args:
+            messages: Async iterable of Gmail API message objects
+            batch_size: Messages per batch (default: the client's batch_size)
+            
+        Yields:
+            Lists of up to batch_size messages; only the last may be shorter
+        """
+        batch_size = batch_size or self.batch_size
+        batch = []
+        async for message in messages:
+            batch.append(message)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        
+        if batch:
+            yield batch
+    
+    async def iter_normalized_messages(
+        self,
+        user_id: str,
+        messages: AsyncIterable[Dict[str, Any]]
+    ) -> AsyncIterator[EmailMessage]:
+        """
+        Normalize a stream of Gmail API messages in chunks of batch_size.
+        
+        Only one chunk of raw and normalized messages is held at a time, so
+        consumers can drain arbitrarily large result sets.
+        
+        Args:
+            user_id: The user ID the messages belong to
+            messages: Async iterable of Gmail API message objects
+            
+        Yields:
+            Normalized EmailMessage objects
+        """
+        async for chunk in self.iter_batches(messages):
+            for normalized in await self.normalize_messages(user_id, chunk):
+                yield normalized
+    
+    async def stream_normalized(
+        self,
+        user_id: str,
+        since_date: Optional[datetime] = None,
+        max_emails: int = 1000,
+        batch_timeout: float = 0.05
+    ) -> AsyncIterator[EmailMessage]:
+        """
+        Fetch and normalize emails as one overlapping pipeline.
+        
+        A producer task pages through the message list into a bounded queue,
+        while max_concurrency consumer tasks drain it in batches of up to
+        batch_size, fetch details and normalize. Listing, detail fetches and
+        normalization therefore overlap, so the total time approaches the
+        slowest stage rather than the sum of all three. Messages are yielded
+        as soon as their batch is done, so the order is not preserved.
+        
+        When the consumer stops early, the worker tasks are cancelled and
+        awaited before the generator closes, so none outlive the stream.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            since_date: Fetch emails since this date, or None for the most
+                recent emails without date filtering (default: None)
+            max_emails: Maximum number of emails to fetch
+            batch_timeout: Seconds a consumer waits for more messages before
+                processing a partial batch (default: 0.05)
+        
+        Yields:
+            Normalized EmailMessage objects
+        """
+        workers = max(1, self.max_concurrency)
+        pending: asyncio.Queue = asyncio.Queue(maxsize=self.batch_size * 4)
+        results: asyncio.Queue = asyncio.Queue()
+        
+        if since_date is None:
+            messages = self.iter_all_emails(user_id, max_emails)
+        else:
+            messages = self.iter_emails_since(user_id, since_date, max_emails)
+        
+        async def produce():
+            try:
+                async for message in messages:
+                    await pending.put(message)
+            except Exception as e:
+                logger.error(f"Error listing emails for user {user_id}: {str(e)}")
+            # One end-of-stream marker per consumer; skipped on cancellation,
+            # when the consumers are being cancelled too and the queue may be full
+            for _ in range(workers):
+                await pending.put(None)
+        
+        async def consume():
+            try:
+                done = False
+                while not done:
+                    message = await pending.get()
+                    if message is None:
+                        break
+                    
+                    batch = [message]
+                    while len(batch) < self.batch_size:
+                        try:
+                            message = await asyncio.wait_for(pending.get(), batch_timeout)
+                        except asyncio.TimeoutError:
+                            break
+                        if message is None:
+                            done = True
+                            break
+                        batch.append(message)
+                    
+                    try:
+                        results.put_nowait(await self.normalize_messages(user_id, batch))
+                    except Exception as e:
+                        logger.error(f"Error normalizing batch of {len(batch)} messages for user {user_id}: {str(e)}")
+            finally:
+                results.put_nowait(None)
+        
+        tasks = [asyncio.create_task(produce())]
+        tasks.extend(asyncio.create_task(consume()) for _ in range(workers))
+        
+        try:
+            finished = 0
+            while finished < workers:
+                normalized_batch = await results.get()
+                if normalized_batch is None:
+                    finished += 1
+                    continue
+                for normalized in normalized_batch:
+                    yield normalized
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
     async def normalize_messages(
         self, 
         user_id: str, 
-        messages: List[Dict[str, Any]]
+        messages: List[Dict[str, Any]],
+        bodies: bool = True
     ) -> List[EmailMessage]:
         """
         Convert Gmail API message format to our internal EmailMessage model.
         
+        Messages normalized before (same id, historyId and detail level) are
+        served from normalized_cache; only the rest go through the processor.
+        Messages without a historyId (or whose details could not be fetched)
+        are never cached, since a label change would go unnoticed.
+        
         Args:
             user_id: The user ID the messages belong to
             messages: List of Gmail API message objects
+            bodies: Fetch full payloads so bodies and attachments are
+                extracted; when False, stubs are fetched with format=metadata
+                and normalized from headers, labels and snippet only
+                (default: True)
             
         Returns:
-            List of normalized EmailMessage objects
+            List of normalized EmailMessage objects, in input order
         """
-        # Get full message details for any messages that don't have them
-        detailed_messages = []
+        detail_level = 'full' if bodies else 'metadata'
+        is_detailed = _has_full_payload if bodies else _has_headers
         
-        for message in messages:
-            # Get full message details if not already present
-            if 'payload' not in message:
-                detailed_message = await self.email_fetcher.get_email_details(user_id, message['id'])
-                detailed_messages.append(detailed_message)
-            else:
-                detailed_messages.append(message)
+        # Fetch details for messages that lack the requested level
+        missing_ids = [message['id'] for message in messages if not is_detailed(message)]
+        fetched = await self._fetch_details(user_id, missing_ids, detail_level) if missing_ids else {}
+        
+        # Keep the original message order
+        detailed_messages = [
+            message if is_detailed(message) else fetched[message['id']]
+            for message in messages
+        ]
+        
+        keys = [
+            (user_id, message.get('id'), message.get('historyId'), detail_level)
+            for message in detailed_messages
+        ]
+        normalized_by_key = {
+            key: self.normalized_cache.get(key) if key[2] is not None else None
+            for key in keys
+        }
+        misses = [
+            message for message, key in zip(detailed_messages, keys)
+            if normalized_by_key[key] is None
+        ]
         
-        # Use the processor to normalize messages
-        return await self.email_processor.normalize_messages(user_id, detailed_messages)
+        if misses:
+            # Use the processor to normalize messages not seen before
+            history_ids = {message.get('id'): message.get('historyId') for message in misses}
+            for normalized in await self.email_processor.normalize_messages(user_id, misses):
+                key = (user_id, normalized.id, history_ids.get(normalized.id), detail_level)
+                normalized_by_key[key] = normalized
+                if key[2] is not None:
+                    self.normalized_cache.set(key, normalized)
+        
+        return [normalized_by_key[key] for key in keys if normalized_by_key[key] is not None]
+    
+    async def get_email_details_batch(
+        self,
+        user_id: str,
+        message_ids: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Get full details for many messages through Gmail's batch endpoint.
+        
+        Up to 100 messages.get calls share one HTTP request, and several such
+        requests run concurrently (bounded by max_concurrency).
+        
+        Args:
+            user_id: The user ID the messages belong to
+            message_ids: IDs of the messages to fetch
+            
+        Returns:
+            Detailed messages in the same order as message_ids (empty dict for
+            messages that could not be fetched)
+        """
+        if not message_ids:
+            return []
+        fetched = await self._fetch_details(user_id, message_ids)
+        return [fetched.get(message_id, {}) for message_id in message_ids]
+    
+    async def _fetch_details(
+        self,
+        user_id: str,
+        message_ids: List[str],
+        detail_level: DetailLevel = 'full'
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch message details in batches, several batches at a time.
+        
+        Batches run concurrently. The concurrency of each user follows an AIMD
+        scheme: it is halved whenever Gmail rate limits a batch (those batches are retried
+        after a backoff, up to max_retries times, and only refetch the
+        messages the failed attempt did not get) and grows by 0.5 per round
+        without rate limiting, up to max_concurrency. Any other failure is
+        logged and its messages are returned as empty dicts.
+        
+        Args:
+            user_id: The user ID the messages belong to
+            message_ids: IDs of the messages to fetch
+            detail_level: 'full' or 'metadata' (default: 'full')
+            
+        Returns:
+            Dict mapping message ID to the detailed message
+        """
+        chunk_size = max(1, min(self.batch_size, GMAIL_BATCH_LIMIT))
+        chunks = [
+            message_ids[start:start + chunk_size]
+            for start in range(0, len(message_ids), chunk_size)
+        ]
+        
+        fetched = {}
+        attempt = 0
+        while chunks:
+            results = await gather_with_concurrency(
+                max(1, int(self._detail_concurrency.get(user_id, self.max_concurrency))),
+                *(
+                    self.email_fetcher.get_email_details_batch(user_id, chunk, detail_level=detail_level)
+                    for chunk in chunks
+                ),
+                return_exceptions=True
+            )
+            
+            rate_limited = []
+            for chunk, details in zip(chunks, results):
+                if isinstance(details, RateLimitError) and attempt < self.max_retries:
+                    rate_limited.append(chunk)
+                    continue
+                if isinstance(details, BaseException):
+                    logger.error(f"Error fetching details for {len(chunk)} messages for user {user_id}: {details}")
+                    details = [{} for _ in chunk]
+                fetched.update(zip(chunk, details))
+            
+            if rate_limited:
+                concurrency = self._detail_concurrency.get(user_id, float(self.max_concurrency))
+                self._detail_concurrency[user_id] = concurrency = max(1.0, concurrency / 2)
+                attempt += 1
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                logger.warning(
+                    f"Rate limited on {len(rate_limited)} detail batches for user {user_id}; "
+                    f"retrying in {delay}s with concurrency {int(concurrency)}"
+                )
+                await asyncio.sleep(delay)
+            else:
+                concurrency = self._detail_concurrency.get(user_id, float(self.max_concurrency))
+                self._detail_concurrency[user_id] = min(float(self.max_concurrency), concurrency + 0.5)
+            chunks = rate_limited
+        return fetched
     
     async def get_attachment(
         self, 
@@ -200,4 +605,8 @@ class GmailClient:
         Returns:
             Dictionary with extracted content
         """
-        return await self.email_processor.extract_content(message)
\ No newline at end of file
+        return await self.email_processor.extract_content(message)
+    
+    async def aclose(self) -> None:
+        """Release the Gmail API client's pooled HTTP connections."""
+        await self.api_client.aclose()
\ No newline at end of file
@@ -7,7 +7,10 @@ fetching operations without mixing in processing or normalization concerns.
 """
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple, AsyncGenerator
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, FrozenSet, Literal
+
+# How much of each message to fetch: headers only, or the full MIME payload
+DetailLevel = Literal['metadata', 'full']
 
 class EmailFetcher(ABC):
     """
@@ -23,7 +26,8 @@ class EmailFetcher(ABC):
         self, 
         user_id: str, 
         since_date: datetime,
-        max_emails: int = 1000
+        max_emails: int = 1000,
+        detail_level: Optional[DetailLevel] = None
     ) -> List[Dict[str, Any]]:
         """
         Get all emails since a given date.
@@ -32,6 +36,8 @@ class EmailFetcher(ABC):
             user_id: The user ID to fetch emails for
             since_date: Fetch emails since this date
             max_emails: Maximum number of emails to fetch
+            detail_level: Fetch message details at this level, or None for
+                ID stubs only (default: None)
             
         Returns:
             List of email metadata in provider-specific format
@@ -56,11 +62,100 @@ class EmailFetcher(ABC):
         """
         pass
     
+    @abstractmethod
+    def iter_emails_since(
+        self,
+        user_id: str,
+        since_date: datetime,
+        max_emails: int = 1000,
+        detail_level: Optional[DetailLevel] = None,
+        labels: Optional[FrozenSet[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream emails since a given date, one message at a time.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            since_date: Fetch emails since this date
+            max_emails: Maximum number of emails to yield
+            detail_level: Fetch message details at this level, or None for
+                ID stubs only (default: None)
+            labels: Only yield emails carrying any of these labels, or None
+                for all emails (default: None)
+            
+        Returns:
+            Async iterator of email metadata in provider-specific format
+        """
+        pass
+    
+    @abstractmethod
+    def iter_emails_since_history(
+        self,
+        user_id: str,
+        start_history_id: Optional[str],
+        since_date: datetime,
+        max_emails: int = 1000,
+        detail_level: Optional[DetailLevel] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream emails added after a mailbox history ID, one message at a time.
+        
+        Falls back to iter_emails_since when there is no history ID or the
+        provider no longer keeps history that far back.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            start_history_id: History ID saved by the last completed sync, or None
+            since_date: Fetch emails since this date when falling back
+            max_emails: Maximum number of emails to yield from the date query
+            detail_level: Fetch message details at this level, or None for
+                ID stubs only (default: None)
+            
+        Returns:
+            Async iterator of email metadata in provider-specific format
+        """
+        pass
+    
+    @abstractmethod
+    async def get_history_id(self, user_id: str) -> str:
+        """
+        Get the mailbox's current history ID.
+        
+        Args:
+            user_id: The user ID to get the history ID for
+            
+        Returns:
+            Current history ID
+        """
+        pass
+    
+    @abstractmethod
+    def iter_all_emails(
+        self,
+        user_id: str,
+        max_emails: int = 100,
+        labels: Optional[FrozenSet[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream emails without date filtering, one message at a time.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            max_emails: Maximum number of emails to yield
+            labels: Only yield emails carrying any of these labels, or None
+                for all emails (default: None)
+            
+        Returns:
+            Async iterator of email metadata in provider-specific format
+        """
+        pass
+    
     @abstractmethod
     async def get_email_details(
         self,
         user_id: str,
-        message_id: str
+        message_id: str,
+        detail_level: DetailLevel = 'full'
     ) -> Dict[str, Any]:
         """
         Get detailed information for a specific email.
@@ -68,11 +163,33 @@ class EmailFetcher(ABC):
         Args:
             user_id: The user ID to fetch the email for
             message_id: The ID of the email to fetch
+            detail_level: 'full' for the complete payload or 'metadata' for headers only
             
         Returns:
             Detailed email information in provider-specific format
         """
         pass
+    
+    @abstractmethod
+    async def get_email_details_batch(
+        self,
+        user_id: str,
+        message_ids: List[str],
+        detail_level: DetailLevel = 'full'
+    ) -> List[Dict[str, Any]]:
+        """
+        Get detailed information for several emails in as few requests as possible.
+        
+        Args:
+            user_id: The user ID to fetch the emails for
+            message_ids: The IDs of the emails to fetch
+            detail_level: 'full' for complete payloads or 'metadata' for headers only
+            
+        Returns:
+            Detailed email information in provider-specific format, in the
+            same order as message_ids
+        """
+        pass
 
 class IEmailFetcher(ABC):
     """Interface for fetching emails from a provider."""
@@ -84,18 +201,31 @@ class IEmailFetcher(ABC):
         """Fetches a list of email message IDs and thread IDs matching the query."""
         pass
 
+    @abstractmethod
+    async def list_history(
+        self, user_id: str, start_history_id: str, max_results: int = 500,
+        page_token: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Fetches the messages added to the mailbox after a history ID."""
+        pass
+
+    @abstractmethod
+    async def get_history_id(self, user_id: str) -> str:
+        """Fetches the mailbox's current history ID."""
+        pass
+
     @abstractmethod
     async def get_email_details(
-        self, user_id: str, message_id: str
+        self, user_id: str, message_id: str, detail_level: DetailLevel = 'full'
     ) -> Optional[dict]:
         """Fetches the detailed content of a specific email message."""
         pass
 
     @abstractmethod
-    async def get_emails_batch(
-        self, user_id: str, message_ids: List[str]
-    ) -> AsyncGenerator[Optional[dict], None]:
-        """Fetches details for a batch of email messages asynchronously."""
+    async def get_email_details_batch(
+        self, user_id: str, message_ids: List[str], detail_level: DetailLevel = 'full'
+    ) -> List[Optional[dict]]:
+        """Fetches the detailed content of many email messages in batched requests."""
         pass
 
     @abstractmethod
@@ -1,6 +1,22 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+try:
+    from pybase64 import urlsafe_b64decode
+except ImportError:
+    from base64 import urlsafe_b64decode
+
+# Headers copied into EmailData fields, keyed by lowercase name
+HEADER_FIELDS = {
+    "subject": "subject",
+    "from": "from_email",
+    "to": "to_email",
+    "cc": "cc_email",
+    "date": "date",
+}
+
 
 class EmailHeader(BaseModel):
     """Email header with name and value."""
@@ -32,19 +48,23 @@ class EmailData(BaseModel):
     body_plain: Optional[str] = None
     body_html: Optional[str] = None
     attachments: List[EmailAttachment] = []
-    raw_data: Dict[str, Any] = {}
+    raw_data: Optional[Dict[str, Any]] = None
     
     class Config:
         allow_population_by_field_name = True
 
     @classmethod
-    def from_gmail_message(cls, user_id: str, message: Dict[str, Any]) -> 'EmailData':
+    def from_gmail_message(
+        cls, user_id: str, message: Dict[str, Any], keep_raw: bool = False
+    ) -> 'EmailData':
         """
         Create an EmailData instance from a Gmail API message.
         
         Args:
             user_id: Gmail user ID
             message: Gmail API message object
+            keep_raw: Keep the full API message, base64 bodies included, in
+                raw_data (default: False)
             
         Returns:
             EmailData instance with parsed message data
@@ -56,146 +76,91 @@ class EmailData(BaseModel):
             "user_id": user_id,
             "labelIds": message.get("labelIds", []),
             "snippet": message.get("snippet", ""),
-            "raw_data": message,
+            "raw_data": message if keep_raw else None,
         }
         
         # Extract headers
-        headers = {}
-        header_map = {
-            "Subject": "subject",
-            "From": "from_email",
-            "To": "to_email",
-            "Cc": "cc_email",
-            "Date": "date",
+        headers = {
+            header["name"]: header.get("value")
+            for header in message.get("payload", {}).get("headers", [])
+            if header.get("name")
         }
         
-        if "payload" in message and "headers" in message["payload"]:
-            for header in message["payload"]["headers"]:
-                name = header.get("name")
-                value = header.get("value")
-                if name:
-                    headers[name] = value
-                    
-                    # Map specific headers to fields
-                    if name in header_map:
-                        field_name = header_map[name]
-                        
-                        # Special handling for date
-                        if field_name == "date" and value:
-                            try:
-                                # Try to parse various date formats
-                                # This is simplified - in production you'd need more robust parsing
-                                email_data[field_name] = datetime.strptime(
-                                    value, "%a, %d %b %Y %H:%M:%S %z"
-                                )
-                            except ValueError:
-                                # Fall back to string if parsing fails
-                                email_data[field_name] = value
-                        else:
-                            email_data[field_name] = value
+        # Map specific headers to fields, matching names case-insensitively
+        by_name = {name.lower(): value for name, value in headers.items()}
+        for header_name, field_name in HEADER_FIELDS.items():
+            if header_name not in by_name:
+                continue
+            value = by_name[header_name]
+            
+            # Special handling for date
+            if field_name == "date" and value:
+                try:
+                    # RFC 2822, including GMT, -0000 and obsolete forms
+                    email_data[field_name] = parsedate_to_datetime(value)
+                except (TypeError, ValueError):
+                    # Fall back to string if parsing fails
+                    email_data[field_name] = value
+            else:
+                email_data[field_name] = value
         
         email_data["headers"] = headers
         
         # Extract body content and attachments
         if "payload" in message:
-            # Get plain text and HTML body
-            email_data.update(
-                _extract_body_content(message["payload"])
-            )
-            
-            # Get attachments
-            email_data["attachments"] = _extract_attachments(message["payload"])
+            body_plain, body_html, attachments = _walk_payload(message["payload"])
+            email_data["body_plain"] = body_plain
+            email_data["body_html"] = body_html
+            email_data["attachments"] = attachments
         
         return cls(**email_data)
 
 
-def _extract_body_content(payload: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Extract the body content from a message payload.
-    
-    Args:
-        payload: Gmail API message payload
-        
-    Returns:
-        Dictionary with body_plain and body_html fields
+def _walk_payload(payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], List[EmailAttachment]]:
     """
-    result = {
-        "body_plain": None,
-        "body_html": None
-    }
+    Extract body content and attachments from a message payload in one pass.
     
-    # Handle the body if it's directly in the payload
-    if "body" in payload and "data" in payload["body"]:
-        mime_type = payload.get("mimeType", "")
-        if "text/plain" in mime_type:
-            result["body_plain"] = _decode_body(payload["body"]["data"])
-        elif "text/html" in mime_type:
-            result["body_html"] = _decode_body(payload["body"]["data"])
-    
-    # Handle multipart messages
-    if "parts" in payload:
-        for part in payload["parts"]:
-            mime_type = part.get("mimeType", "")
-            
-            if "text/plain" in mime_type and "body" in part and "data" in part["body"]:
-                result["body_plain"] = _decode_body(part["body"]["data"])
-            elif "text/html" in mime_type and "body" in part and "data" in part["body"]:
-                result["body_html"] = _decode_body(part["body"]["data"])
-            
-            # Recursively check for nested parts
-            if "parts" in part:
-                nested_result = _extract_body_content(part)
-                if not result["body_plain"] and nested_result["body_plain"]:
-                    result["body_plain"] = nested_result["body_plain"]
-                if not result["body_html"] and nested_result["body_html"]:
-                    result["body_html"] = nested_result["body_html"]
-    
-    return result
-
-
-def _extract_attachments(payload: Dict[str, Any]) -> List[EmailAttachment]:
-    """
-    Extract attachments from a message payload.
+    The MIME tree is walked depth-first with an explicit stack so each part is
+    visited exactly once; the first text/plain and text/html parts in document
+    order become the bodies.
     
     Args:
         payload: Gmail API message payload
         
     Returns:
-        List of EmailAttachment objects
+        Tuple of (body_plain, body_html, attachments)
     """
+    body_plain = None
+    body_html = None
     attachments = []
+    stack = [payload]
     
-    # Handle attachments in the main payload
-    if "body" in payload and "attachmentId" in payload["body"]:
-        attachments.append(
-            EmailAttachment(
-                attachment_id=payload["body"]["attachmentId"],
-                filename=payload.get("filename", ""),
-                mime_type=payload.get("mimeType", ""),
-                size=payload["body"].get("size", 0)
-            )
-        )
-    
-    # Handle attachments in parts
-    if "parts" in payload:
-        for part in payload["parts"]:
-            # Check if this part is an attachment
-            if "body" in part and "attachmentId" in part["body"]:
+    while stack:
+        part = stack.pop()
+        body = part.get("body")
+        if body:
+            if "attachmentId" in body:
                 attachments.append(
                     EmailAttachment(
-                        attachment_id=part["body"]["attachmentId"],
+                        attachment_id=body["attachmentId"],
                         filename=part.get("filename", ""),
                         mime_type=part.get("mimeType", ""),
-                        size=part["body"].get("size", 0)
+                        size=body.get("size", 0)
                     )
                 )
-            
-            # Recursively check nested parts
-            if "parts" in part:
-                nested_attachments = _extract_attachments(part)
-                attachments.extend(nested_attachments)
+            elif "data" in body:
+                mime_type = part.get("mimeType", "")
+                if body_plain is None and "text/plain" in mime_type:
+                    body_plain = _decode_body(body["data"])
+                elif body_html is None and "text/html" in mime_type:
+                    body_html = _decode_body(body["data"])
+        
+        parts = part.get("parts")
+        if parts:
+            # Reversed so parts are popped in document order
+            stack.extend(reversed(parts))
     
-    return attachments
+    return body_plain, body_html, attachments
 
 
 def _decode_body(data: str) -> str:
@@ -208,17 +173,11 @@ def _decode_body(data: str) -> str:
     Returns:
         Decoded string
     """
-    import base64
-    
-    # Replace URL-safe characters and add padding if needed
-    data = data.replace("-", "+").replace("_", "/")
-    padding = len(data) % 4
-    if padding:
-        data += "=" * (4 - padding)
-    
-    # Decode from base64
+    # Decode from base64url; stray non-UTF-8 bytes should not cost the whole body.
+    # Gmail may strip the padding, which neither decoder accepts, but both
+    # ignore surplus padding, so two "=" complete any input without counting
     try:
-        return base64.b64decode(data).decode("utf-8")
+        return urlsafe_b64decode(data + "==").decode("utf-8", errors="replace")
     except Exception:
         # Fall back to empty string if decoding fails
         return ""
\ No newline at end of file
@@ -7,13 +7,15 @@ to provide a clean separation of concerns.
 """
 from typing import Dict, Any, List, Optional
 import logging
-import base64
 
 from services.email_service.src.interfaces.attachment_handler import AttachmentHandler
 from services.email_service.src.gmail_api_client import GmailApiClient
 
 logger = logging.getLogger(__name__)
 
+# Shared stand-in for parts without a body; only ever read
+_EMPTY_BODY: Dict[str, Any] = {}
+
 class GmailAttachmentHandler(AttachmentHandler):
     """
     Gmail-specific implementation of the AttachmentHandler interface.
@@ -46,32 +48,30 @@ class GmailAttachmentHandler(AttachmentHandler):
             attachment_id: The specific attachment ID
             
         Returns:
-            Dict containing the attachment data and metadata
+            Dict with the attachment and message IDs, the decoded content
+            under "decoded_data" and its size, or an empty dict on failure
         """
         logger.info(f"Fetching attachment {attachment_id} from message {message_id}")
         
         try:
-            # Fetch the attachment from the Gmail API
-            attachment_data = await self.api_client.get_attachment(
+            # The API client decodes the base64url payload itself, so the
+            # content is held once rather than as both text and bytes
+            decoded_data = await self.api_client.get_attachment(
                 user_id, 
                 message_id, 
                 attachment_id
             )
             
-            if not attachment_data:
+            if not decoded_data:
                 logger.warning(f"No attachment data found for ID {attachment_id}")
                 return {}
-                
-            # Decode attachment data
-            if "data" in attachment_data:
-                try:
-                    # Base64 decode the attachment data
-                    decoded_data = base64.urlsafe_b64decode(attachment_data["data"])
-                    attachment_data["decoded_data"] = decoded_data
-                except Exception as e:
-                    logger.error(f"Error decoding attachment data: {str(e)}")
             
-            return attachment_data
+            return {
+                "attachment_id": attachment_id,
+                "message_id": message_id,
+                "size": len(decoded_data),
+                "decoded_data": decoded_data,
+            }
             
         except Exception as e:
             logger.error(f"Error fetching attachment: {str(e)}")
@@ -90,7 +90,7 @@ class GmailAttachmentHandler(AttachmentHandler):
         Returns:
             List of dictionaries with attachment metadata
         """
-        logger.info(f"Extracting attachment metadata from message {message.get('id', 'unknown')}")
+        logger.debug("Extracting attachment metadata from message %s", message.get('id', 'unknown'))
         
         attachments = []
         
@@ -136,20 +136,16 @@ class GmailAttachmentHandler(AttachmentHandler):
             part: Message part containing attachment
             attachments: List to append attachment metadata to
         """
-        # Extract attachment metadata
-        attachment_id = part.get("body", {}).get("attachmentId", "")
-        filename = part.get("filename", "")
-        mime_type = part.get("mimeType", "")
-        size = part.get("body", {}).get("size", 0)
-        
         # Skip if no attachment ID (inline content)
+        body = part.get("body") or _EMPTY_BODY
+        attachment_id = body.get("attachmentId")
         if not attachment_id:
             return
             
         # Add metadata to results
         attachments.append({
             "id": attachment_id,
-            "filename": filename,
-            "mime_type": mime_type,
-            "size": size
-        })
\ No newline at end of file
+            "filename": part.get("filename", ""),
+            "mime_type": part.get("mimeType", ""),
+            "size": body.get("size", 0)
+        })
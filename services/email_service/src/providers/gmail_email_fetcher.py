@@ -5,37 +5,123 @@ This module implements the EmailFetcher interface for Gmail.
 It encapsulates all Gmail-specific logic for fetching emails to provide
 a clean separation of concerns.
 """
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, AsyncIterator, FrozenSet, Set
+import asyncio
 import logging
+import math
 
-from services.email_service.src.interfaces.email_fetcher import EmailFetcher
+from services.email_service.src.interfaces.email_fetcher import EmailFetcher, DetailLevel
 from services.email_service.src.gmail_api_client import GmailApiClient
+from shared.exceptions import RateLimitError, ResourceNotFoundError
+from shared.utils.lru_cache import LRUCache
+from shared.utils.retry import async_retry_on_rate_limit
 
 logger = logging.getLogger(__name__)
 
+# Fetched details only need to outlive a rate limited batch's retries (the
+# AIMD backoff adds up to about half a minute), not the ingestion itself
+DETAILS_CACHE_SIZE = 2_000
+DETAILS_CACHE_TTL = 60
+
+
+@lru_cache(maxsize=128)
+def _build_day_query(since_day: date) -> str:
+    """Build the Gmail search query for messages received after a given day."""
+    return f"after:{since_day.strftime('%Y/%m/%d')}"
+
+
+def _build_since_query(since_date: datetime, now: Optional[datetime] = None) -> str:
+    """
+    Build the Gmail search query for messages received after a given time.
+    
+    Gmail reads a numeric after: value as UNIX seconds, which keeps sub-day
+    polling windows precise. Naive datetimes have no reliable epoch, so
+    windows shorter than a day use an hour-granular newer_than: query and
+    longer ones keep the day-granular after: query.
+    
+    Args:
+        since_date: Fetch emails received after this time
+        now: Current time to measure naive windows against (default: datetime.now())
+        
+    Returns:
+        Gmail search query string
+    """
+    if since_date.tzinfo is not None:
+        return f"after:{int(since_date.timestamp())}"
+    
+    window = (now or datetime.now()) - since_date
+    if timedelta(0) <= window < timedelta(days=1):
+        # Round up so the window never starts later than since_date
+        hours = max(1, math.ceil(window / timedelta(hours=1)))
+        return f"newer_than:{hours}h"
+    return _build_day_query(since_date.date())
+
+
+def _with_labels(query: str, labels: Optional[FrozenSet[str]]) -> str:
+    """
+    Restrict a Gmail search query to messages carrying any of the given labels.
+    
+    Labels are matched by Gmail itself, so unwanted messages are never listed
+    or fetched. They are sorted so the same set always yields the same query.
+    Gmail spells spaces in label names as hyphens.
+    
+    Args:
+        query: Gmail search query to restrict, possibly empty
+        labels: Label names to match, or None/empty for no restriction
+        
+    Returns:
+        Gmail search query string
+    """
+    if not labels:
+        return query
+    terms = ' '.join(f"label:{label.replace(' ', '-')}" for label in sorted(labels))
+    label_query = f"{{{terms}}}"
+    return f"{query} {label_query}" if query else label_query
+
+
 class GmailEmailFetcher(EmailFetcher):
     """
     Gmail-specific implementation of the EmailFetcher interface.
     
     This class follows the Interface Segregation Principle by implementing only
     methods related to email fetching, not processing or normalizing them.
+    
+    Message details are cached briefly by (user_id, message_id, detail_level)
+    so a batch retried after a rate limit only requests the messages it did
+    not get yet. Labels and historyId change over time, so entries expire
+    after DETAILS_CACHE_TTL seconds rather than being kept for reuse. A
+    cached full message also satisfies metadata lookups.
     """
     
-    def __init__(self, api_client: GmailApiClient):
+    def __init__(
+        self,
+        api_client: GmailApiClient,
+        page_size: int = 100,
+        details_cache: Optional[LRUCache] = None
+    ):
         """
         Initialize with a Gmail API client.
         
         Args:
             api_client: Gmail API client for making API requests
+            page_size: Number of messages to request per list page (default: 100)
+            details_cache: Cache for message details (default: DETAILS_CACHE_SIZE
+                entries, expiring after DETAILS_CACHE_TTL seconds)
         """
         self.api_client = api_client
+        self.page_size = page_size
+        self.details_cache = details_cache if details_cache is not None else LRUCache(
+            maxsize=DETAILS_CACHE_SIZE, ttl=DETAILS_CACHE_TTL
+        )
     
     async def get_emails_since(
         self, 
         user_id: str, 
         since_date: datetime,
-        max_emails: int = 1000
+        max_emails: int = 1000,
+        detail_level: Optional[DetailLevel] = None
     ) -> List[Dict[str, Any]]:
         """
         Get all emails since a given date.
@@ -44,24 +130,110 @@ class GmailEmailFetcher(EmailFetcher):
             user_id: The user ID to fetch emails for
             since_date: Fetch emails since this date
             max_emails: Maximum number of emails to fetch
+            detail_level: Fetch message details at this level, or None for
+                ID stubs only (default: None)
             
         Returns:
             List of email metadata in Gmail-specific format
         """
+        messages = [
+            message
+            async for message in self.iter_emails_since(user_id, since_date, max_emails, detail_level)
+        ]
+        logger.info(f"Fetched {len(messages)} emails since {since_date:%Y/%m/%d} for user {user_id}")
+        return messages
+    
+    async def iter_emails_since(
+        self,
+        user_id: str,
+        since_date: datetime,
+        max_emails: int = 1000,
+        detail_level: Optional[DetailLevel] = None,
+        labels: Optional[FrozenSet[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream emails since a given date, one message at a time.
+        
+        Use detail_level='metadata' when only headers (From, Subject, Date, ...)
+        are needed; it skips the base64 MIME bodies that dominate full payloads.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            since_date: Fetch emails since this date
+            max_emails: Maximum number of emails to yield
+            detail_level: Fetch message details at this level, or None for
+                ID stubs only (default: None)
+            labels: Only yield emails carrying any of these labels, or None
+                for all emails (default: None)
+            
+        Yields:
+            Email metadata in Gmail-specific format
+        """
         logger.info(f"Fetching emails since {since_date} for user {user_id}")
         
-        # Format date for Gmail query
-        date_str = since_date.strftime("%Y/%m/%d")
-        query = f"after:{date_str}"
+        query = _with_labels(_build_since_query(since_date), labels)
         
-        try:
-            # Fetch messages matching the query
-            messages = await self._fetch_emails_with_query(user_id, query, max_emails)
-            logger.info(f"Fetched {len(messages)} emails since {date_str} for user {user_id}")
-            return messages
-        except Exception as e:
-            logger.error(f"Error fetching emails since {date_str} for user {user_id}: {str(e)}")
-            return []
+        async for message in self._paginate(user_id, query, max_emails, detail_level):
+            yield message
+    
+    async def iter_emails_since_history(
+        self,
+        user_id: str,
+        start_history_id: Optional[str],
+        since_date: datetime,
+        max_emails: int = 1000,
+        detail_level: Optional[DetailLevel] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream emails added after a mailbox history ID, one message at a time.
+        
+        history.list only returns what changed since the last completed sync,
+        so repeated polls no longer re-list the whole date window. Without a
+        history ID, or once Gmail has expired it (after about a week), this
+        falls back to a date query from since_date.
+        
+        max_emails only caps the date query: every message added after the
+        history ID is yielded, since the caller saves a newer ID afterwards
+        and anything left unlisted would never be fetched.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            start_history_id: History ID saved by the last completed sync, or None
+            since_date: Fetch emails since this date when falling back
+            max_emails: Maximum number of emails to yield from the date query
+            detail_level: Fetch message details at this level, or None for
+                ID stubs only (default: None)
+            
+        Yields:
+            Email metadata in Gmail-specific format
+        """
+        if start_history_id:
+            logger.info(f"Fetching emails added since history {start_history_id} for user {user_id}")
+            try:
+                async for message in self._paginate_history(user_id, start_history_id, detail_level):
+                    yield message
+                return
+            except ResourceNotFoundError:
+                logger.info(f"History {start_history_id} expired for user {user_id}, fetching by date instead")
+        
+        # The caller saves a newer history ID once this stream ends, so list
+        # failures must fail the sync here too instead of ending it early
+        logger.info(f"Fetching emails since {since_date} for user {user_id}")
+        query = _build_since_query(since_date)
+        async for message in self._paginate(user_id, query, max_emails, detail_level, raise_errors=True):
+            yield message
+    
+    async def get_history_id(self, user_id: str) -> str:
+        """
+        Get the mailbox's current history ID.
+        
+        Args:
+            user_id: The user ID to get the history ID for
+            
+        Returns:
+            Current Gmail history ID
+        """
+        return await self.api_client.get_history_id(user_id)
     
     async def get_all_emails(
         self,
@@ -78,21 +250,38 @@ class GmailEmailFetcher(EmailFetcher):
         Returns:
             List of email metadata in Gmail-specific format
         """
+        messages = [message async for message in self.iter_all_emails(user_id, max_emails)]
+        logger.info(f"Fetched {len(messages)} emails for user {user_id}")
+        return messages
+    
+    async def iter_all_emails(
+        self,
+        user_id: str,
+        max_emails: int = 100,
+        labels: Optional[FrozenSet[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream emails without date filtering, one message at a time.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            max_emails: Maximum number of emails to yield
+            labels: Only yield emails carrying any of these labels, or None
+                for all emails (default: None)
+            
+        Yields:
+            Email metadata in Gmail-specific format
+        """
         logger.info(f"Fetching all emails for user {user_id} (max: {max_emails})")
         
-        try:
-            # Fetch messages without a specific query
-            messages = await self._fetch_emails_with_query(user_id, "", max_emails)
-            logger.info(f"Fetched {len(messages)} emails for user {user_id}")
-            return messages
-        except Exception as e:
-            logger.error(f"Error fetching emails for user {user_id}: {str(e)}")
-            return []
+        async for message in self._paginate(user_id, _with_labels("", labels), max_emails):
+            yield message
     
     async def get_email_details(
         self,
         user_id: str,
-        message_id: str
+        message_id: str,
+        detail_level: DetailLevel = 'full'
     ) -> Dict[str, Any]:
         """
         Get detailed information for a specific email.
@@ -100,48 +289,234 @@ class GmailEmailFetcher(EmailFetcher):
         Args:
             user_id: The user ID to fetch the email for
             message_id: The ID of the email to fetch
+            detail_level: 'full' for the complete payload or 'metadata' for
+                headers only (default: 'full')
             
         Returns:
             Detailed email information in Gmail-specific format
         """
-        logger.info(f"Fetching email details for message {message_id}")
+        cached = self.details_cache.get((user_id, message_id, 'full'))
+        if cached is None and detail_level == 'metadata':
+            cached = self.details_cache.get((user_id, message_id, 'metadata'))
+        if cached is not None:
+            return cached
+        
+        logger.debug("Fetching email details for message %s", message_id)
         
         try:
-            # Get the full message details
-            message = await self.api_client.get_email_details(user_id, message_id)
+            message = await self.api_client.get_email_details(user_id, message_id, detail_level)
+            if message:
+                self.details_cache.set((user_id, message_id, detail_level), message)
             return message
         except Exception as e:
             logger.error(f"Error fetching email details for message {message_id}: {str(e)}")
             return {}
     
-    async def _fetch_emails_with_query(
+    async def get_email_details_batch(
         self,
         user_id: str,
-        query: str,
-        max_results: int
+        message_ids: List[str],
+        detail_level: DetailLevel = 'full'
     ) -> List[Dict[str, Any]]:
         """
-        Helper method to fetch emails with a specific query.
+        Get detailed information for several emails using Gmail batch requests.
+        
+        Args:
+            user_id: The user ID to fetch the emails for
+            message_ids: The IDs of the emails to fetch
+            detail_level: 'full' for complete payloads or 'metadata' for headers only
+            
+        Returns:
+            Detailed email information in Gmail-specific format, in the same
+            order as message_ids (empty dict for messages that failed)
+            
+        Raises:
+            RateLimitError: If Gmail rate limited the batch; messages fetched
+                before that are cached, so retrying resumes where it stopped
+        """
+        found = {}
+        for message_id in message_ids:
+            cached = self.details_cache.get((user_id, message_id, 'full'))
+            if cached is None and detail_level == 'metadata':
+                cached = self.details_cache.get((user_id, message_id, 'metadata'))
+            if cached is not None:
+                found[message_id] = cached
+        
+        missing_ids = [message_id for message_id in message_ids if message_id not in found]
+        if missing_ids:
+            logger.debug("Fetching email details for %d messages (%d cached)", len(missing_ids), len(found))
+            try:
+                messages = await self.api_client.get_email_details_batch(
+                    user_id, missing_ids, detail_level=detail_level
+                )
+            except RateLimitError as e:
+                # Keep what was fetched before the limit hit, so the caller's
+                # retry after its backoff only requests the remaining messages
+                for message_id, message in e.details.get('messages', {}).items():
+                    self.details_cache.set((user_id, message_id, detail_level), message)
+                raise
+            except Exception as e:
+                logger.error(f"Error fetching email details batch for user {user_id}: {str(e)}")
+                messages = []
+            
+            for message_id, message in zip(missing_ids, messages):
+                if message:
+                    found[message_id] = message
+                    self.details_cache.set((user_id, message_id, detail_level), message)
+        
+        return [found.get(message_id, {}) for message_id in message_ids]
+    
+    @async_retry_on_rate_limit(max_retries=5, base_delay=1)
+    async def _get_page_details(
+        self,
+        user_id: str,
+        message_ids: List[str],
+        detail_level: DetailLevel
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch the details of a listed page, backing off when rate limited.
+        
+        Each retry only requests the messages not fetched (and cached) by
+        the attempts before it.
+        """
+        return await self.get_email_details_batch(user_id, message_ids, detail_level)
+    
+    async def _paginate(
+        self,
+        user_id: str,
+        query: str,
+        remaining: int,
+        detail_level: Optional[DetailLevel] = None,
+        raise_errors: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream messages matching a query until `remaining` messages were yielded.
+        
+        Pages through the results, requesting the next page as soon as its
+        token is known so the list call is in flight while the consumer
+        handles the current page. Each request asks for at most the number of
+        messages still needed, so the final page is never over-fetched.
+        Messages that shift between pages while the mailbox changes are
+        yielded only once. Errors are logged and end the stream (or are
+        re-raised with raise_errors); a query that successfully matches
+        nothing is logged separately so the two cases can be told apart.
+        
+        With a detail_level, each page of stubs is replaced by its details
+        (fetched in one batch) while the next list page is already in flight.
         
         Args:
             user_id: The user ID to fetch emails for
             query: Gmail query string
-            max_results: Maximum number of results to fetch
+            remaining: Maximum number of messages to yield
+            detail_level: Fetch message details at this level, or None for stubs
+            raise_errors: Re-raise errors after logging them instead of
+                ending the stream quietly (default: False)
             
-        Returns:
-            List of messages matching the query
+        Yields:
+            Messages matching the query
         """
+        seen_ids: Set[str] = set()
+        next_page = None
+        
         try:
-            # Get email list using the Gmail API client
-            # The get_email_list method now returns a tuple (messages, next_page_token)
-            messages, _ = await self.api_client.get_email_list(
-                user_id, 
-                query=query, 
-                max_results=max_results
-            )
+            # A page is only ever scheduled while messages are still wanted, so
+            # "no page in flight" is the single exit condition of the loop
+            if remaining > 0:
+                next_page = asyncio.create_task(self._fetch_page(user_id, query, remaining))
+            while next_page is not None:
+                page, page_token = await next_page
+                next_page = None
+                
+                page = [message for message in page if message['id'] not in seen_ids][:remaining]
+                seen_ids.update(message['id'] for message in page)
+                remaining -= len(page)
+                if page_token and remaining > 0:
+                    next_page = asyncio.create_task(
+                        self._fetch_page(user_id, query, remaining, page_token)
+                    )
+                
+                if detail_level is not None:
+                    page = await self._get_page_details(
+                        user_id, [message['id'] for message in page], detail_level
+                    )
+                
+                for message in page:
+                    if message:
+                        yield message
             
-            # Return the messages list directly
-            return messages
+            # Reaching here means every list call succeeded, so an empty result
+            # is a genuine "nothing matched" rather than a swallowed failure
+            if not seen_ids:
+                logger.info(f"Query '{query}' matched no emails")
         except Exception as e:
-            logger.error(f"Error fetching emails with query '{query}': {str(e)}")
-            return []
\ No newline at end of file
+            logger.error(f"Gmail API failure fetching emails with query '{query}': {str(e)}")
+            if raise_errors:
+                raise
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+    
+    async def _paginate_history(
+        self,
+        user_id: str,
+        start_history_id: str,
+        detail_level: Optional[DetailLevel] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream every message added after a history ID.
+        
+        A message can appear in several history records; it is yielded once.
+        Unlike _paginate, errors are not swallowed: an expired history ID
+        raises ResourceNotFoundError so the caller can fall back to a date
+        query, and any other failure must fail the sync so its history ID is
+        not advanced past messages that were never listed.
+        
+        Args:
+            user_id: The user ID to fetch emails for
+            start_history_id: History ID to list changes after
+            detail_level: Fetch message details at this level, or None for stubs
+            
+        Yields:
+            Messages added after start_history_id
+        """
+        seen_ids: Set[str] = set()
+        page_token = None
+        
+        while True:
+            page, page_token = await self.api_client.list_history(
+                user_id, start_history_id, page_token=page_token
+            )
+            
+            added = {}
+            for message in page:
+                if message['id'] not in seen_ids:
+                    added.setdefault(message['id'], message)
+            page = list(added.values())
+            seen_ids.update(added)
+            
+            if detail_level is not None:
+                page = await self._get_page_details(
+                    user_id, [message['id'] for message in page], detail_level
+                )
+            
+            for message in page:
+                if message:
+                    yield message
+            
+            if not page_token:
+                break
+    
+    async def _fetch_page(
+        self,
+        user_id: str,
+        query: str,
+        remaining: int,
+        page_token: Optional[str] = None
+    ):
+        """Fetch one page of at most `remaining` message stubs."""
+        return await self.api_client.get_email_list(
+            user_id,
+            query=query,
+            max_results=min(self.page_size, remaining),
+            page_token=page_token
+        )
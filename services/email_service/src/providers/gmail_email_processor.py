@@ -5,34 +5,91 @@ This module implements the EmailProcessor interface for Gmail.
 It encapsulates all Gmail-specific logic for processing and normalizing emails
 to provide a clean separation of concerns.
 """
+from concurrent.futures import Executor
 from typing import List, Dict, Any, Optional
+import asyncio
 import logging
-import base64
-from datetime import datetime
+import os
 
 from services.email_service.src.interfaces.email_processor import EmailProcessor
 from services.email_service.src.content_extractor import EmailContentExtractor
+from services.email_service.src.email_normalizer import EmailNormalizer
 from shared.models.email import EmailMessage
-from shared.utils.text_utils import html_to_text
 
 logger = logging.getLogger(__name__)
 
+# Messages above this size are worth the cost of shipping to another process
+LARGE_MESSAGE_BYTES = 128 * 1024
+
+
+def _message_size(message: Dict[str, Any]) -> int:
+    """
+    Estimate the size of a Gmail message in bytes.
+    
+    Uses Gmail's `sizeEstimate` when present, otherwise sums the body sizes
+    of all MIME parts.
+    
+    Args:
+        message: Gmail API message object
+        
+    Returns:
+        Approximate message size in bytes
+    """
+    if message.get('sizeEstimate'):
+        return message['sizeEstimate']
+    
+    size = 0
+    stack = [message.get('payload', {})]
+    while stack:
+        part = stack.pop()
+        body = part.get('body', {})
+        size += body.get('size') or len(body.get('data', ''))
+        stack.extend(part.get('parts', []))
+    return size
+
 class GmailEmailProcessor(EmailProcessor):
     """
     Gmail-specific implementation of the EmailProcessor interface.
     
     This class follows the Interface Segregation Principle by implementing only
     methods related to email processing and normalization, not fetching them.
+    
+    Normalization (MIME walking, base64 decoding, HTML to text) is CPU-bound, so
+    it runs in an executor instead of on the event loop. Pass a
+    ProcessPoolExecutor to spread large batches across cores; by default the
+    event loop's thread pool is used. Messages larger than
+    `large_message_bytes` can be routed to a separate `large_message_executor`
+    (typically a shared ProcessPoolExecutor) so that heavy HTML conversion
+    does not hold the GIL while small messages go through threads.
     """
     
-    def __init__(self, content_extractor: EmailContentExtractor = None):
+    def __init__(
+        self,
+        content_extractor: EmailContentExtractor = None,
+        executor: Optional[Executor] = None,
+        max_chunks: Optional[int] = None,
+        large_message_executor: Optional[Executor] = None,
+        large_message_bytes: int = LARGE_MESSAGE_BYTES,
+        keep_raw: bool = False
+    ):
         """
         Initialize with optional content extractor.
         
         Args:
             content_extractor: Helper for extracting email content
+            executor: Executor that runs normalization (default: loop's thread pool)
+            max_chunks: Number of slices a batch is split into (default: CPU count)
+            large_message_executor: Executor for messages above `large_message_bytes`
+                (default: None, large messages are handled like the rest)
+            large_message_bytes: Size above which a message counts as large (default: 128 KB)
+            keep_raw: Attach the raw header map to each message as raw_data (default: False)
         """
         self.content_extractor = content_extractor or EmailContentExtractor()
+        self.normalizer = EmailNormalizer(self.content_extractor, keep_raw=keep_raw)
+        self.executor = executor
+        self.max_chunks = max_chunks or os.cpu_count() or 1
+        self.large_message_executor = large_message_executor
+        self.large_message_bytes = large_message_bytes
     
     async def normalize_messages(
         self, 
@@ -42,68 +99,63 @@ class GmailEmailProcessor(EmailProcessor):
         """
         Convert Gmail-specific email format to our internal EmailMessage model.
         
+        The batch is split into up to `max_chunks` slices that are normalized
+        concurrently in the executor, keeping the event loop free. When a
+        `large_message_executor` is configured, each large message is
+        normalized there on its own.
+        
         Args:
             user_id: The user ID the messages belong to
             messages: List of Gmail-specific message objects
             
         Returns:
-            List of normalized EmailMessage objects
+            List of normalized EmailMessage objects, in input order
         """
-        logger.info(f"Normalizing {len(messages)} messages for user {user_id}")
+        logger.debug("Normalizing %d messages for user %s", len(messages), user_id)
+        
+        messages = [message for message in messages if message]
+        if not messages:
+            return []
         
-        result = []
+        small, large = [], []
         for message in messages:
-            try:
-                if not message:
-                    continue
-                    
-                # Extract basic message attributes
-                message_id = message.get("id", "")
-                thread_id = message.get("threadId", "")
-                
-                # Extract payload data
-                payload = message.get("payload", {})
-                headers = payload.get("headers", [])
-                
-                # Extract headers
-                subject = self._get_header_value(headers, "Subject", "")
-                from_email = self._get_header_value(headers, "From", "")
-                to_email = self._get_header_value(headers, "To", "")
-                cc = self._get_header_value(headers, "Cc", "")
-                date_str = self._get_header_value(headers, "Date", "")
-                
-                # Parse received date
-                received_date = self._parse_date(date_str)
-                
-                # Extract content
-                content = await self.extract_content(message)
-                
-                # Create normalized email message
-                normalized_message = EmailMessage(
-                    id=message_id,
-                    thread_id=thread_id,
-                    user_id=user_id,
-                    subject=subject,
-                    from_email=from_email,
-                    to=to_email,
-                    cc=cc,
-                    body_text=content.get("text", ""),
-                    body_html=content.get("html", ""),
-                    received_date=received_date,
-                    has_attachments=bool(content.get("attachments")),
-                    attachment_count=len(content.get("attachments", [])),
-                    attachment_details=content.get("attachments", []),
-                    labels=message.get("labelIds", []),
-                    raw_data=message
-                )
-                
-                result.append(normalized_message)
-                
-            except Exception as e:
-                logger.error(f"Error normalizing message: {str(e)}")
+            if (
+                self.large_message_executor is not None
+                and _message_size(message) > self.large_message_bytes
+            ):
+                large.append(message)
+            else:
+                small.append(message)
+        
+        loop = asyncio.get_running_loop()
+        tasks = []
+        if small:
+            chunk_size = -(-len(small) // self.max_chunks)
+            tasks.extend(
+                loop.run_in_executor(self.executor, self.normalizer.normalize_batch, small[i:i + chunk_size], user_id)
+                for i in range(0, len(small), chunk_size)
+            )
+        tasks.extend(
+            loop.run_in_executor(self.large_message_executor, self.normalizer.normalize_batch, [message], user_id)
+            for message in large
+        )
+        chunk_results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        normalized_by_id = {}
+        for chunk_result in chunk_results:
+            if isinstance(chunk_result, Exception):
+                logger.error(f"Error normalizing messages: {str(chunk_result)}")
                 continue
+            for email in chunk_result:
+                normalized_by_id[email.id] = email
+        
+        result = [
+            normalized_by_id[message.get('id')]
+            for message in messages
+            if message.get('id') in normalized_by_id
+        ]
                 
-        logger.info(f"Successfully normalized {len(result)} messages")
+        logger.debug("Successfully normalized %d messages", len(result))
         return result
     
     async def extract_content(
@@ -119,7 +171,7 @@ class GmailEmailProcessor(EmailProcessor):
         Returns:
             Dictionary with extracted content
         """
-        logger.info(f"Extracting content for message {message.get('id', 'unknown')}")
+        logger.debug("Extracting content for message %s", message.get('id', 'unknown'))
         
         try:
             # Use the content extractor to extract email content
@@ -132,53 +184,3 @@ class GmailEmailProcessor(EmailProcessor):
                 "html": "",
                 "attachments": []
             }
-    
-    def _get_header_value(self, headers: List[Dict[str, str]], name: str, default: str = "") -> str:
-        """
-        Helper method to get a header value by name.
-        
-        Args:
-            headers: List of header dictionaries
-            name: Header name to search for
-            default: Default value if header not found
-            
-        Returns:
-            Header value or default if not found
-        """
-        for header in headers:
-            if header.get("name", "").lower() == name.lower():
-                return header.get("value", default)
-        return default
-    
-    def _parse_date(self, date_str: str) -> Optional[datetime]:
-        """
-        Parse a date string to datetime object.
-        
-        Args:
-            date_str: Date string from email header
-            
-        Returns:
-            Parsed datetime or None if parsing fails
-        """
-        if not date_str:
-            return None
-            
-        try:
-            # Try several date formats
-            for fmt in [
-                "%a, %d %b %Y %H:%M:%S %z",  # RFC 2822 format
-                "%d %b %Y %H:%M:%S %z",
-                "%a, %d %b %Y %H:%M:%S",
-                "%d %b %Y %H:%M:%S"
-            ]:
-                try:
-                    return datetime.strptime(date_str.strip(), fmt)
-                except ValueError:
-                    continue
-                    
-            logger.warning(f"Unable to parse date string: {date_str}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error parsing date: {str(e)}")
-            return None
\ No newline at end of file
@@ -1,19 +1,61 @@
+import asyncio
 import time
 import logging
-from redis import Redis
-from typing import Optional, Union
+from redis.asyncio import Redis
+from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Refill and take tokens in one atomic round trip. KEYS: tokens key, last
+# refill key. ARGV: now, max_tokens, refill_rate, refill_time, cost. Returns
+# {allowed, tokens left}; a cost of 0 only refills and reports the count, and
+# a negative cost returns tokens to the bucket, up to max_tokens.
+TOKEN_BUCKET_SCRIPT = """
+local tokens = tonumber(redis.call('GET', KEYS[1]))
+local last_refill = tonumber(redis.call('GET', KEYS[2]))
+local now = tonumber(ARGV[1])
+local max_tokens = tonumber(ARGV[2])
+local cost = tonumber(ARGV[5])
+local changed = false
+
+if tokens == nil or last_refill == nil then
+    tokens = max_tokens
+    redis.call('SET', KEYS[2], now)
+    changed = true
+else
+    local periods = math.floor((now - last_refill) / tonumber(ARGV[4]))
+    if periods > 0 then
+        tokens = math.min(tokens + periods * tonumber(ARGV[3]), max_tokens)
+        redis.call('SET', KEYS[2], now)
+        changed = true
+    end
+end
+
+local allowed = 0
+if tokens >= cost then
+    allowed = 1
+    if cost ~= 0 then
+        tokens = math.min(tokens - cost, max_tokens)
+        changed = true
+    end
+end
+if changed then
+    redis.call('SET', KEYS[1], tokens)
+end
+return {allowed, tokens}
+"""
+
 class TokenBucketRateLimiter:
     """
     A token bucket algorithm implementation for rate limiting backed by Redis.
     
     This class manages rate limiting for Gmail API requests, ensuring we stay within 
     quota limits. Each request consumes tokens from a bucket that refills over time.
+    Acquiring, releasing and counting tokens all run TOKEN_BUCKET_SCRIPT, so
+    the refill and the change are one atomic Redis round trip.
     
     Attributes:
-        redis: Redis client for storing token bucket state
+        redis: Async Redis client for storing token bucket state
         bucket_name: Unique identifier for this rate limiter bucket
         max_tokens: Maximum number of tokens the bucket can hold
         refill_rate: Number of tokens added per refill_time
@@ -38,14 +80,16 @@ class TokenBucketRateLimiter:
             max_tokens: Maximum tokens the bucket can hold (default: 200)
             refill_rate: Number of tokens added per refill_time (default: 200)
             refill_time: Time period in seconds for token refill (default: 1)
-            redis_client: Optional Redis client for testing
+            redis_client: Optional async Redis client, e.g. one on a shared
+                connection pool or a mock for testing
         """
-        # Allow injection of Redis client for testing
+        # Allow injection of a Redis client
         self.redis = redis_client if redis_client is not None else Redis.from_url(redis_url)
         self.bucket_name = bucket_name
         self.max_tokens = max_tokens
         self.refill_rate = refill_rate
         self.refill_time = refill_time
+        self._bucket_script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
         
     async def acquire_tokens(self, tokens_to_consume: int) -> bool:
         """
@@ -57,81 +101,76 @@ class TokenBucketRateLimiter:
         Returns:
             bool: True if tokens were successfully acquired, False otherwise
         """
-        # Refill tokens based on time elapsed
-        await self._refill_tokens()
-        
-        # Get current token count
-        current_tokens = await self._get_current_tokens()
+        allowed, new_tokens = await self._run_bucket_script(tokens_to_consume)
         
-        # Check if enough tokens are available
-        if current_tokens < tokens_to_consume:
+        # Check if enough tokens were available
+        if not allowed:
             logger.warning(
-                f"Rate limit hit. Requested {tokens_to_consume} tokens, but only {current_tokens} available"
+                f"Rate limit hit. Requested {tokens_to_consume} tokens, but only {new_tokens} available"
             )
             return False
         
-        # Consume tokens
-        new_tokens = current_tokens - tokens_to_consume
-        self.redis.set(f"{self.bucket_name}:tokens", str(new_tokens), ex=None)
-        
-        logger.debug(
-            f"Acquired {tokens_to_consume} tokens. {new_tokens} tokens remaining."
-        )
+        logger.debug("Acquired %d tokens. %d tokens remaining.", tokens_to_consume, new_tokens)
         return True
     
-    async def _get_current_tokens(self) -> int:
+    async def release_tokens(self, tokens: int) -> None:
         """
-        Get current token count from Redis.
+        Return tokens that were acquired for requests that never reached the API.
         
-        Returns:
-            int: Current token count, or max_tokens if not set
-        """
-        tokens = self.redis.get(f"{self.bucket_name}:tokens")
-        if tokens is None:
-            # Initialize bucket if not exists
-            await self.reset_bucket()
-            return self.max_tokens
-        return int(tokens)
-    
-    async def _refill_tokens(self) -> None:
-        """Refill tokens based on time elapsed since last refill."""
-        # Get last refill time
-        last_refill_str = self.redis.get(f"{self.bucket_name}:last_refill")
-        if last_refill_str is None:
-            # Initialize if not exists
-            await self.reset_bucket()
-            return
-        
-        last_refill = int(last_refill_str)
-        current_time = int(time.time())
-        time_passed = current_time - last_refill
+        The bucket is never filled beyond max_tokens.
         
-        # Only refill if enough time has passed
-        if time_passed < self.refill_time:
+        Args:
+            tokens: Number of tokens to return
+        """
+        if tokens <= 0:
             return
+        _, new_tokens = await self._run_bucket_script(-tokens)
+        logger.debug("Released %d tokens. New total: %d/%d", tokens, new_tokens, self.max_tokens)
+    
+    async def available_tokens(self) -> int:
+        """
+        Get the number of tokens currently available, refilling the bucket first.
         
-        # Calculate tokens to add
-        periods_passed = time_passed // self.refill_time
-        rate_limit_tokens_to_add = periods_passed * self.refill_rate
-        
-        if rate_limit_tokens_to_add <= 0:
-            return
+        Returns:
+            int: Number of tokens that can be consumed right now
+        """
+        _, tokens = await self._run_bucket_script(0)
+        return tokens
+    
+    async def wait_for_tokens(self, tokens: int) -> None:
+        """
+        Wait until at least the given number of tokens is available.
         
-        # Add tokens up to max_tokens
-        current_tokens = await self._get_current_tokens()
-        new_tokens = min(current_tokens + rate_limit_tokens_to_add, self.max_tokens)
+        Requests larger than the bucket are capped at max_tokens so the wait
+        always terminates.
         
-        # Update token count and last refill time
-        self.redis.set(f"{self.bucket_name}:tokens", str(new_tokens), ex=None)
-        self.redis.set(f"{self.bucket_name}:last_refill", str(current_time), ex=None)
+        Args:
+            tokens: Number of tokens to wait for
+        """
+        tokens = min(tokens, self.max_tokens)
+        while await self.available_tokens() < tokens:
+            await asyncio.sleep(self.refill_time)
+    
+    async def _run_bucket_script(self, cost: int) -> Tuple[bool, int]:
+        """
+        Refill the bucket for the time elapsed and take `cost` tokens if available.
         
-        logger.debug(
-            f"Refilled {rate_limit_tokens_to_add} tokens. New total: {new_tokens}/{self.max_tokens}"
+        Args:
+            cost: Number of tokens to take, 0 to only refill, or negative to
+                return tokens
+            
+        Returns:
+            Whether the tokens were taken, and the tokens left in the bucket
+        """
+        allowed, tokens = await self._bucket_script(
+            keys=[f"{self.bucket_name}:tokens", f"{self.bucket_name}:last_refill"],
+            args=[int(time.time()), self.max_tokens, self.refill_rate, self.refill_time, cost]
         )
+        return bool(allowed), int(tokens)
     
     async def reset_bucket(self) -> None:
         """Reset the token bucket to its initial state."""
         current_time = int(time.time())
-        self.redis.set(f"{self.bucket_name}:tokens", str(self.max_tokens), ex=None)
-        self.redis.set(f"{self.bucket_name}:last_refill", str(current_time), ex=None)
+        await self.redis.set(f"{self.bucket_name}:tokens", str(self.max_tokens), ex=None)
+        await self.redis.set(f"{self.bucket_name}:last_refill", str(current_time), ex=None)
         logger.debug(f"Reset token bucket '{self.bucket_name}' to {self.max_tokens} tokens")
\ No newline at end of file
@@ -63,7 +63,8 @@ class VolumeBasedPollingStrategy(PollingStrategy):
         Calculate the optimal polling interval based on email volume metrics.
         
         Args:
-            metrics: List of metrics from previous sync operations
+            metrics: List of metrics from previous sync operations, or a
+                single metrics dict for the latest sync
             
         Returns:
             Optimal polling interval in minutes
@@ -71,6 +72,10 @@ class VolumeBasedPollingStrategy(PollingStrategy):
         if not metrics:
             return self.DEFAULT_INTERVAL
         
+        # SyncStateManager passes only the latest sync's metrics
+        if isinstance(metrics, dict):
+            metrics = [metrics]
+        
         # Calculate average email count from metrics
         email_counts = [
             m.get("email_count", 0) for m in metrics 
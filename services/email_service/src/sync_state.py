@@ -1,8 +1,10 @@
 import logging
 import json
 import asyncio
-from typing import Dict, Any, Optional, List, Callable, TypeVar, cast, Coroutine
-from datetime import datetime
+import time
+import uuid
+from typing import Dict, Any, Optional, List, Callable, TypeVar, cast, Coroutine, AsyncIterator
+from datetime import datetime, timedelta
 import redis.asyncio as redis
 import functools
 
@@ -15,20 +17,67 @@ logger = logging.getLogger(__name__)
 # Type variable for the return type of the Redis operation
 T = TypeVar('T')
 
+# Seconds an ingestion claim is held without being refreshed; a worker that
+# crashed stops blocking the user's ingestion once its lease runs out
+INGESTION_CLAIM_TTL_SECONDS = 300
+
+# Claim a user's ingestion for one worker and record its first status.
+# KEYS: claim key, status hash. ARGV: owner, lease seconds, user ID, status
+CLAIM_INGESTION_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    redis.call('HSET', KEYS[2], ARGV[3], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+# Overwrite a user's ingestion status and renew the lease only while the
+# claim is held by this worker, so a worker whose ingestion was stopped
+# elsewhere (or whose lease ran out) cannot re-create the claim.
+# KEYS: claim key, status hash. ARGV: owner, lease seconds, user ID, status
+SAVE_CLAIMED_STATUS_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    redis.call('HSET', KEYS[2], ARGV[3], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+# Drop a claim only if this worker still holds it. KEYS: claim key. ARGV: owner
+RELEASE_CLAIM_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 class SyncStateManager:
     """
     Manages email synchronization state using Redis.
     Tracks sync progress, history, and rates to enable resumable operations
     and adaptive polling.
+    
+    Pass a connection_pool to share a bounded set of Redis connections with
+    the rest of the service; the pool is owned by the caller and left open by
+    close(). Without one, a client with its own pool is created from redis_url.
+    
+    Ingestion claims are leases owned by this manager's owner_id and expire
+    after claim_ttl seconds unless a status save renews them.
     """
     def __init__(
         self, 
         redis_url: str, 
         polling_strategy: PollingStrategy, # Depend on interface
-        key_prefix: str = "email_sync:"
+        key_prefix: str = "email_sync:",
+        connection_pool: Optional[redis.ConnectionPool] = None,
+        claim_ttl: int = INGESTION_CLAIM_TTL_SECONDS
     ):
         self.redis_url = redis_url
         self.key_prefix = key_prefix
+        self.connection_pool = connection_pool
+        self.claim_ttl = claim_ttl
+        self.owner_id = uuid.uuid4().hex
         self._redis = None
         self._initialized = False
         self.polling_strategy = polling_strategy # Use injected strategy
@@ -39,11 +88,14 @@ class SyncStateManager:
             return
             
         try:
-            self._redis = redis.from_url(
-                self.redis_url, 
-                decode_responses=True, 
-                socket_connect_timeout=5
-            )
+            if self.connection_pool is not None:
+                self._redis = redis.Redis(connection_pool=self.connection_pool)
+            else:
+                self._redis = redis.from_url(
+                    self.redis_url, 
+                    decode_responses=True, 
+                    socket_connect_timeout=5
+                )
             # Test connection
             await self._redis.ping()
             self._initialized = True
@@ -257,6 +309,156 @@ class SyncStateManager:
         )
         return True
     
+    async def save_progress(self, user_id: str, message_id: str, metrics: Dict[str, Any]) -> bool:
+        """
+        Save the last processed message ID and record sync metrics together.
+        
+        Equivalent to save_last_message_id followed by update_sync_metrics_in_redis,
+        but the message ID write and the metrics read share one pipelined round
+        trip, so checkpointing a batch takes two round trips instead of three.
+        
+        Args:
+            user_id: The user ID
+            message_id: The last successfully processed message ID
+            metrics: Dictionary with metrics (count, duration, etc.)
+            
+        Returns:
+            True if successful
+        """
+        timestamp = datetime.now().isoformat()
+        metrics["timestamp"] = timestamp
+        message_key = self._get_user_key(user_id, "last_message")
+        metrics_key = self._get_user_key(user_id, "metrics")
+        
+        async def operation(redis_client):
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    pipe.set(message_key, json.dumps({"message_id": message_id, "timestamp": timestamp}))
+                    pipe.get(metrics_key)
+                    _, metrics_json = await pipe.execute()
+                
+                metrics_list = json.loads(metrics_json) if metrics_json else []
+                metrics_list.append(metrics)
+                await redis_client.set(metrics_key, json.dumps(metrics_list[-10:]))
+                logger.info(f"Saved progress at message {message_id} for user {user_id}: {metrics}")
+                return True
+            except json.JSONDecodeError as e:
+                logger.error(f"Failed to decode sync metrics JSON for user {user_id}: {e}. Data: {metrics_json}")
+                raise SyncStateError(f"Corrupted sync metrics data found for user {user_id}") from e
+            except TypeError as e:
+                logger.error(f"Failed to serialize sync progress for user {user_id}: {e}")
+                raise SyncStateError(f"Invalid sync progress data for user {user_id}") from e
+            
+        await self._redis_operation(
+            operation,
+            f"Failed to save sync progress for user {user_id}"
+        )
+        return True
+    
+    async def save_history_id(self, user_id: str, history_id: str) -> bool:
+        """
+        Save the mailbox history ID that the next sync lists changes from.
+        
+        Args:
+            user_id: The user ID
+            history_id: Gmail history ID the last completed sync covered up to
+            
+        Returns:
+            True if successful
+        """
+        key = self._get_user_key(user_id, "history_id")
+        
+        async def operation(redis_client):
+            await redis_client.set(key, history_id)
+            return True
+            
+        return await self._redis_operation(
+            operation,
+            f"Failed to save history ID for user {user_id}"
+        )
+    
+    async def get_history_id(self, user_id: str) -> Optional[str]:
+        """
+        Get the mailbox history ID saved by the last completed sync.
+        
+        Args:
+            user_id: The user ID
+            
+        Returns:
+            The history ID or None if no sync completed yet
+        """
+        key = self._get_user_key(user_id, "history_id")
+        
+        async def operation(redis_client):
+            return await redis_client.get(key)
+            
+        return await self._redis_operation(
+            operation,
+            f"Failed to get history ID for user {user_id}"
+        )
+    
+    async def filter_unpublished(self, user_id: str, message_ids: List[str]) -> List[str]:
+        """
+        Drop the message IDs already recorded as published for a user.
+        
+        Checks every ID in one ZMSCORE round trip against the set kept by
+        mark_published, so polls that list the same window again do not fetch,
+        normalize and publish those messages a second time.
+        
+        Args:
+            user_id: The user ID
+            message_ids: Message IDs about to be processed
+            
+        Returns:
+            The IDs not published yet, in input order
+        """
+        if not message_ids:
+            return []
+        key = self._get_user_key(user_id, "published")
+        
+        async def operation(redis_client):
+            scores = await redis_client.zmscore(key, message_ids)
+            return [message_id for message_id, score in zip(message_ids, scores) if score is None]
+            
+        return await self._redis_operation(
+            operation,
+            f"Failed to check published messages for user {user_id}"
+        )
+    
+    async def mark_published(self, user_id: str, message_ids: List[str], retention: timedelta) -> bool:
+        """
+        Record message IDs as published for a user.
+        
+        IDs are scored with the time they were recorded, and IDs older than
+        `retention` are pruned in the same pipelined round trip, so the set only
+        covers the window that polls can list again.
+        
+        Args:
+            user_id: The user ID
+            message_ids: Message IDs whose publishing was confirmed
+            retention: How long to remember a published ID
+            
+        Returns:
+            True if successful
+        """
+        if not message_ids:
+            return True
+        key = self._get_user_key(user_id, "published")
+        now = time.time()
+        
+        async def operation(redis_client):
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.zadd(key, dict.fromkeys(message_ids, now))
+                pipe.zremrangebyscore(key, "-inf", now - retention.total_seconds())
+                pipe.expire(key, retention)
+                await pipe.execute()
+            return True
+            
+        return await self._redis_operation(
+            operation,
+            f"Failed to record published messages for user {user_id}"
+        )
+    
     async def get_sync_metrics(self, user_id: str) -> List[Dict[str, Any]]:
         """
         Get sync metrics history for adaptive polling decisions.
@@ -381,4 +583,202 @@ class SyncStateManager:
         return await self._redis_operation(
             operation,
             f"Failed to get sync status for user {user_id}"
-        )
\ No newline at end of file
+        )
+    
+    def _get_ingestion_key(self) -> str:
+        """Generate the key of the hash holding every user's ingestion status."""
+        return f"{self.key_prefix}ingestions"
+    
+    async def claim_ingestion(self, user_id: str, status: Dict[str, Any]) -> bool:
+        """
+        Claim a user's ingestion for this worker and record its initial status.
+        
+        The claim is a per-user key set with SET NX EX, so of several
+        replicas starting the same user's ingestion at once only one
+        succeeds, and a claim left by a crashed worker expires after
+        claim_ttl seconds.
+        
+        Args:
+            user_id: The user ID
+            status: Initial ingestion status
+            
+        Returns:
+            True if the ingestion was claimed, False if another worker holds it
+        """
+        claim_key = self._get_user_key(user_id, "ingestion_claim")
+        key = self._get_ingestion_key()
+        
+        async def operation(redis_client):
+            try:
+                claimed = await redis_client.eval(
+                    CLAIM_INGESTION_SCRIPT, 2, claim_key, key,
+                    self.owner_id, self.claim_ttl, user_id, json.dumps(status)
+                )
+                return bool(claimed)
+            except TypeError as e:
+                logger.error(f"Failed to serialize ingestion status for user {user_id}: {e}")
+                raise SyncStateError(f"Invalid ingestion status data for user {user_id}") from e
+            
+        return await self._redis_operation(
+            operation,
+            f"Failed to claim ingestion for user {user_id}"
+        )
+    
+    async def save_ingestion_status(self, user_id: str, status: Dict[str, Any]) -> bool:
+        """
+        Save the ingestion status for a user while this worker holds its claim.
+        
+        The check, the write and the lease renewal run as one Lua script, so
+        a status published after the claim was released (the ingestion was
+        stopped through another worker) or expired is dropped instead of
+        re-claiming the user.
+        
+        Args:
+            user_id: The user ID
+            status: Ingestion status
+            
+        Returns:
+            True if saved, False if this worker no longer holds the claim
+        """
+        claim_key = self._get_user_key(user_id, "ingestion_claim")
+        key = self._get_ingestion_key()
+        
+        async def operation(redis_client):
+            try:
+                saved = await redis_client.eval(
+                    SAVE_CLAIMED_STATUS_SCRIPT, 2, claim_key, key,
+                    self.owner_id, self.claim_ttl, user_id, json.dumps(status)
+                )
+                return bool(saved)
+            except TypeError as e:
+                logger.error(f"Failed to serialize ingestion status for user {user_id}: {e}")
+                raise SyncStateError(f"Invalid ingestion status data for user {user_id}") from e
+            
+        return await self._redis_operation(
+            operation,
+            f"Failed to save ingestion status for user {user_id}"
+        )
+    
+    async def get_ingestion_status(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the ingestion status for a user.
+        
+        Args:
+            user_id: The user ID
+            
+        Returns:
+            Status dictionary or None if no ingestion is recorded
+        """
+        key = self._get_ingestion_key()
+        
+        async def operation(redis_client):
+            status_json = await redis_client.hget(key, user_id)
+            if status_json:
+                try:
+                    return json.loads(status_json)
+                except json.JSONDecodeError as e:
+                    logger.error(f"Failed to decode ingestion status JSON for user {user_id}: {e}. Data: {status_json}")
+                    raise SyncStateError(f"Corrupted ingestion status data found for user {user_id}") from e
+            return None
+            
+        return await self._redis_operation(
+            operation,
+            f"Failed to get ingestion status for user {user_id}"
+        )
+    
+    async def delete_ingestion_status(self, user_id: str) -> bool:
+        """
+        Remove the ingestion status for a user and its claim, whichever
+        worker holds it.
+        
+        Args:
+            user_id: The user ID
+            
+        Returns:
+            True if a status or claim was removed, False if neither was recorded
+        """
+        claim_key = self._get_user_key(user_id, "ingestion_claim")
+        key = self._get_ingestion_key()
+        
+        async def operation(redis_client):
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.hdel(key, user_id)
+                pipe.delete(claim_key)
+                removed_status, removed_claim = await pipe.execute()
+            return bool(removed_status or removed_claim)
+            
+        return await self._redis_operation(
+            operation,
+            f"Failed to delete ingestion status for user {user_id}"
+        )
+    
+    async def release_ingestion_claim(self, user_id: str) -> bool:
+        """
+        Release this worker's claim on a user's ingestion, keeping its status.
+        
+        The last status stays readable, e.g. a failed sync's error, while
+        any worker may claim the ingestion again.
+        
+        Args:
+            user_id: The user ID
+            
+        Returns:
+            True if the claim was released, False if this worker did not hold it
+        """
+        claim_key = self._get_user_key(user_id, "ingestion_claim")
+        
+        async def operation(redis_client):
+            return bool(await redis_client.eval(RELEASE_CLAIM_SCRIPT, 1, claim_key, self.owner_id))
+            
+        return await self._redis_operation(
+            operation,
+            f"Failed to release ingestion claim for user {user_id}"
+        )
+    
+    def _get_ingestion_stop_channel(self) -> str:
+        """Generate the pub/sub channel that announces stopped ingestions."""
+        return f"{self.key_prefix}ingestion_stops"
+    
+    async def publish_ingestion_stop(self, user_id: str) -> int:
+        """
+        Announce to every worker that a user's ingestion was stopped.
+        
+        Args:
+            user_id: The user ID
+            
+        Returns:
+            Number of workers that received the announcement
+        """
+        channel = self._get_ingestion_stop_channel()
+        
+        async def operation(redis_client):
+            return await redis_client.publish(channel, user_id)
+            
+        return await self._redis_operation(
+            operation,
+            f"Failed to announce stopped ingestion for user {user_id}"
+        )
+    
+    async def listen_ingestion_stops(self) -> AsyncIterator[str]:
+        """
+        Yield the user IDs of ingestions stopped through any worker.
+        
+        Holds one connection from the pool for as long as it is iterated.
+        
+        Yields:
+            User IDs passed to publish_ingestion_stop
+            
+        Raises:
+            SyncStateError: If the subscription fails or is lost
+        """
+        redis_client = await self._get_redis()
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self._get_ingestion_stop_channel())
+            async for message in pubsub.listen():
+                yield message["data"]
+        except (redis.ConnectionError, redis.RedisError) as e:
+            logger.error(f"Lost subscription to stopped ingestions (Redis Error): {e}")
+            raise SyncStateError("Redis error: Lost subscription to stopped ingestions") from e
+        finally:
+            await pubsub.close()
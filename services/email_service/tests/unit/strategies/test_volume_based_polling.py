@@ -72,6 +72,13 @@ class TestVolumeBasedPollingStrategy:
         # Assert it returns the default interval
         assert interval == strategy.DEFAULT_INTERVAL
     
+    @pytest.mark.asyncio
+    async def test_single_metrics_dict(self, strategy):
+        """Test that the latest sync's metrics can be passed on their own."""
+        interval = await strategy.calculate_polling_interval_minutes({"email_count": 60})
+        
+        assert interval == strategy.HIGH_VOLUME_INTERVAL
+    
     @pytest.mark.asyncio
     async def test_custom_thresholds(self):
         """Test that custom thresholds are respected."""
@@ -114,4 +114,49 @@ class TestEmailContentExtractor:
         assert attachments[0]['id'] == "attachment123"
         assert attachments[0]['filename'] == "test.pdf"
         assert attachments[0]['mime_type'] == "application/pdf"
-        assert attachments[0]['size'] == 12345
\ No newline at end of file
+        assert attachments[0]['size'] == 12345
+    
+    def test_nested_parts_visited_in_order(self, content_extractor):
+        """Test that nested multipart trees are walked in document order."""
+        def encode(text):
+            return base64.urlsafe_b64encode(text.encode()).decode()
+        
+        payload = {
+            "mimeType": "multipart/mixed",
+            "parts": [
+                {
+                    "mimeType": "multipart/alternative",
+                    "parts": [
+                        {"mimeType": "text/plain", "body": {"data": encode("First text")}},
+                        {"mimeType": "text/html", "body": {"data": encode("<p>First html</p>")}}
+                    ]
+                },
+                {"mimeType": "text/plain", "body": {"data": encode("Second text")}},
+                {
+                    "mimeType": "multipart/mixed",
+                    "parts": [
+                        {"mimeType": "image/png", "filename": "a.png", "body": {"attachmentId": "att1", "size": 1}},
+                        {"mimeType": "application/pdf", "filename": "b.pdf", "body": {"attachmentId": "att2", "size": 2}}
+                    ]
+                }
+            ]
+        }
+        
+        html, text = content_extractor.extract_body(payload)
+        attachments = content_extractor.get_attachments(payload)
+        
+        assert text == "First text"
+        assert html == "<p>First html</p>"
+        assert [a['id'] for a in attachments] == ["att1", "att2"]
+    
+    def test_extract_body_uses_declared_charset(self, content_extractor):
+        """Test that parts are decoded with the charset from their Content-Type header."""
+        payload = {
+            "mimeType": "text/plain",
+            "headers": [{"name": "Content-Type", "value": 'text/plain; charset="windows-1252"'}],
+            "body": {"data": base64.urlsafe_b64encode("Café – menu".encode("windows-1252")).decode()}
+        }
+        
+        html, text = content_extractor.extract_body(payload)
+        
+        assert text == "Café – menu"
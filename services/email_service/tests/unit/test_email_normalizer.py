@@ -1,6 +1,7 @@
 import pytest
-from unittest.mock import MagicMock
-from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from datetime import datetime, timezone
 from services.email_service.src.email_normalizer import EmailNormalizer
 from services.email_service.src.content_extractor import EmailContentExtractor
 from shared.models.email import EmailMessage, EmailAddress
@@ -89,4 +90,68 @@ class TestEmailNormalizer:
         assert normalized[0].id == "msg1"
         assert normalized[0].subject == "Subject 1"
         assert normalized[1].id == "msg2"
-        assert normalized[1].subject == "Subject 2"
\ No newline at end of file
+        assert normalized[1].subject == "Subject 2"
+    
+    def test_parse_date_rfc2822(self, normalizer):
+        """Test that RFC 2822 dates are parsed without the ISO fast path."""
+        with patch("services.email_service.src.email_normalizer.ciso8601", None):
+            parsed = normalizer._parse_date("Fri, 25 Apr 2025 12:00:00 +0000")
+        
+        expected = datetime.fromtimestamp(datetime(2025, 4, 25, 12, tzinfo=timezone.utc).timestamp())
+        assert parsed == expected
+        assert normalizer._parse_date("not a date") is None
+    
+    def test_parse_date_iso_fast_path(self, normalizer):
+        """Test that ISO 8601 dates use ciso8601 when it is available."""
+        fake_ciso8601 = SimpleNamespace(parse_datetime=MagicMock(side_effect=datetime.fromisoformat))
+        
+        with patch("services.email_service.src.email_normalizer.ciso8601", fake_ciso8601):
+            parsed = normalizer._parse_date("2025-04-25T12:00:00+00:00")
+            normalizer._parse_date("Fri, 25 Apr 2025 12:00:00 +0000")
+        
+        expected = datetime.fromtimestamp(datetime(2025, 4, 25, 12, tzinfo=timezone.utc).timestamp())
+        assert parsed == expected
+        fake_ciso8601.parse_datetime.assert_called_once_with("2025-04-25T12:00:00+00:00")
+
+    
+    def test_raw_data_only_kept_when_requested(self, mock_content_extractor):
+        """Test that the raw header map is attached only with keep_raw."""
+        message = {
+            "id": "msg1",
+            "threadId": "thread1",
+            "payload": {"headers": [{"name": "Subject", "value": "Subject 1"}]}
+        }
+        
+        dropped = EmailNormalizer(mock_content_extractor).normalize(message, "user123")
+        kept = EmailNormalizer(mock_content_extractor, keep_raw=True).normalize(message, "user123")
+        
+        assert dropped.raw_data is None
+        assert kept.raw_data["headers"]["Subject"] == "Subject 1"
+    
+    def test_headers_matched_case_insensitively(self, normalizer):
+        """Test that only normalized headers are collected, whatever their case."""
+        message = {
+            "id": "msg1",
+            "payload": {
+                "headers": [
+                    {"name": "SUBJECT", "value": "Shouting"},
+                    {"name": "cc", "value": "copy@example.com"},
+                    {"name": "X-Mailer", "value": "Mailer 1.0"}
+                ]
+            }
+        }
+        
+        headers = normalizer._get_headers_dict(message, {"subject": "Subject", "cc": "Cc"})
+        normalized = normalizer.normalize(message, "user123")
+        
+        assert headers == {"Subject": "Shouting", "Cc": "copy@example.com"}
+        assert normalized.subject == "Shouting"
+        assert normalized.cc_addresses[0].email == "copy@example.com"
+    
+    def test_labels_are_interned(self, normalizer):
+        """Test that equal label ids across messages share one string object."""
+        first = normalizer.normalize({"id": "msg1", "labelIds": ["".join(["IN", "BOX"])]}, "user123")
+        second = normalizer.normalize({"id": "msg2", "labelIds": ["".join(["IN", "BOX"])]}, "user123")
+        
+        assert first.labels == ["INBOX"]
+        assert first.labels[0] is second.labels[0]
@@ -1,13 +1,17 @@
+import asyncio
+import base64
 import pytest
 import pytest_asyncio
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from services.email_service.src.gmail_client import GmailClient
 from services.email_service.src.gmail_api_client import GmailApiClient
 from services.email_service.src.email_normalizer import EmailNormalizer
 from services.email_service.src.content_extractor import EmailContentExtractor
 from services.email_service.src.rate_limiter import TokenBucketRateLimiter
 from shared.models.email import EmailMessage, EmailAddress
+from shared.exceptions import RateLimitError, ResourceNotFoundError
 
 class TestGmailClient:
     """Test cases for the GmailClient class."""
@@ -142,6 +146,133 @@ class TestGmailClient:
         assert emails[1]["id"] == "msg2"
         assert emails[2]["id"] == "msg3"
     
+    @pytest.mark.asyncio
+    async def test_get_all_emails_paginates(self, gmail_client, mock_api_client):
+        """Test that pages are followed until max_emails is reached."""
+        mock_api_client.get_email_list.side_effect = [
+            ([{"id": "msg1"}, {"id": "msg2"}], "token2"),
+            ([{"id": "msg3"}, {"id": "msg4"}], "token3"),
+            ([{"id": "msg5"}], None)
+        ]
+        
+        emails = await gmail_client.get_all_emails("user123", max_emails=3)
+        
+        assert [e["id"] for e in emails] == ["msg1", "msg2", "msg3"]
+        assert mock_api_client.get_email_list.call_count == 2
+        page_tokens = [c.kwargs["page_token"] for c in mock_api_client.get_email_list.call_args_list]
+        assert page_tokens == [None, "token2"]
+        # The second request only asks for the one message still needed
+        page_sizes = [c.kwargs["max_results"] for c in mock_api_client.get_email_list.call_args_list]
+        assert page_sizes == [3, 1]
+    
+    @pytest.mark.asyncio
+    async def test_get_all_emails_skips_duplicate_ids(self, gmail_client, mock_api_client):
+        """Test that a message repeated on a later page is yielded only once."""
+        mock_api_client.get_email_list.side_effect = [
+            ([{"id": "msg1"}, {"id": "msg2"}], "token2"),
+            ([{"id": "msg2"}, {"id": "msg3"}], None)
+        ]
+        
+        emails = await gmail_client.get_all_emails("user123", max_emails=10)
+        
+        assert [e["id"] for e in emails] == ["msg1", "msg2", "msg3"]
+    
+    @pytest.mark.asyncio
+    async def test_get_all_emails_zero_max_skips_request(self, gmail_client, mock_api_client):
+        """Test that no list request is issued when no emails are wanted."""
+        emails = await gmail_client.get_all_emails("user123", max_emails=0)
+        
+        assert emails == []
+        mock_api_client.get_email_list.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_empty_result_logged_apart_from_api_failure(self, gmail_client, mock_api_client, caplog):
+        """Test that an empty match and a failed list call produce different log lines."""
+        mock_api_client.get_email_list.return_value = ([], None)
+        with caplog.at_level("INFO"):
+            assert await gmail_client.get_all_emails("user123") == []
+        assert "matched no emails" in caplog.text
+        assert "API failure" not in caplog.text
+        
+        caplog.clear()
+        mock_api_client.get_email_list.side_effect = RuntimeError("boom")
+        with caplog.at_level("INFO"):
+            assert await gmail_client.get_all_emails("user123") == []
+        assert "API failure" in caplog.text
+        assert "matched no emails" not in caplog.text
+    
+    @pytest.mark.asyncio
+    async def test_get_emails_since_lists_fresh_each_poll(self, gmail_client, mock_api_client):
+        """Test that repeated polls with the same query list the mailbox again."""
+        mock_api_client.get_email_list.side_effect = [
+            ([{"id": "msg1"}], None),
+            ([{"id": "msg2"}, {"id": "msg1"}], None)
+        ]
+        
+        first = await gmail_client.get_emails_since("user123", datetime(2025, 4, 25, 9, 0))
+        second = await gmail_client.get_emails_since("user123", datetime(2025, 4, 25, 9, 0))
+        
+        assert first == [{"id": "msg1"}]
+        assert second == [{"id": "msg2"}, {"id": "msg1"}]
+        assert mock_api_client.get_email_list.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_get_emails_since_aware_date_uses_epoch_query(self, gmail_client, mock_api_client):
+        """Test that timezone-aware dates keep sub-day precision in the query."""
+        mock_api_client.get_email_list.return_value = ([], None)
+        since_date = datetime(2025, 4, 25, 9, 30, tzinfo=timezone.utc)
+        
+        await gmail_client.get_emails_since("user123", since_date)
+        
+        query = mock_api_client.get_email_list.call_args.kwargs["query"]
+        assert query == f"after:{int(since_date.timestamp())}"
+    
+    @pytest.mark.asyncio
+    async def test_iter_emails_since_filters_labels_in_query(self, gmail_client, mock_api_client):
+        """Test that include labels become one stable Gmail OR clause."""
+        mock_api_client.get_email_list.return_value = ([], None)
+        labels = frozenset({"Work Projects", "INBOX"})
+        
+        emails = gmail_client.iter_emails_since("user123", datetime(2025, 4, 25), labels=labels)
+        assert [e async for e in emails] == []
+        emails = gmail_client.iter_all_emails("user123", labels=labels)
+        assert [e async for e in emails] == []
+        
+        queries = [c.kwargs["query"] for c in mock_api_client.get_email_list.call_args_list]
+        assert queries == [
+            "after:2025/04/25 {label:INBOX label:Work-Projects}",
+            "{label:INBOX label:Work-Projects}"
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_get_emails_since_recent_naive_date_uses_hours(self, gmail_client, mock_api_client):
+        """Test that naive windows under a day use an hour-granular newer_than query."""
+        mock_api_client.get_email_list.return_value = ([], None)
+        since_date = datetime.now() - timedelta(hours=2, minutes=30)
+        
+        await gmail_client.get_emails_since("user123", since_date)
+        
+        query = mock_api_client.get_email_list.call_args.kwargs["query"]
+        assert query == "newer_than:3h"
+    
+    @pytest.mark.asyncio
+    async def test_get_emails_since_with_metadata(self, gmail_client, mock_api_client):
+        """Test that listed stubs are replaced by their metadata-only details."""
+        mock_api_client.get_email_list.return_value = ([{"id": "msg1"}, {"id": "msg2"}], None)
+        mock_api_client.get_email_details_batch.return_value = [
+            {"id": "msg1", "payload": {"headers": [{"name": "Subject", "value": "One"}]}},
+            None
+        ]
+        
+        emails = await gmail_client.get_emails_since(
+            "user123", datetime(2025, 4, 25), detail_level="metadata"
+        )
+        
+        assert [e["id"] for e in emails] == ["msg1"]
+        mock_api_client.get_email_details_batch.assert_called_once_with(
+            "user123", ["msg1", "msg2"], detail_level="metadata"
+        )
+    
     @pytest.mark.asyncio
     async def test_normalize_messages(self, gmail_client, mock_api_client, mock_content_extractor):
         """Test normalizing Gmail API messages to internal format."""
@@ -170,7 +301,7 @@ class TestGmailClient:
         # Mock the entire email_processor component
         gmail_client.email_processor = AsyncMock()
         gmail_client.email_fetcher = AsyncMock()
-        gmail_client.email_fetcher.get_email_details.return_value = detailed_message
+        gmail_client.email_fetcher.get_email_details_batch.return_value = [detailed_message]
         
         # Create test data - message without payload needs to be fetched
         messages = [{"id": "msg1"}]
@@ -203,4 +334,401 @@ class TestGmailClient:
         
         # Verify the detailed messages were passed to the email_processor
         expected_detailed_messages = [detailed_message]
-        gmail_client.email_processor.normalize_messages.assert_called_once_with("user123", expected_detailed_messages)
\ No newline at end of file
+        gmail_client.email_processor.normalize_messages.assert_called_once_with("user123", expected_detailed_messages)
+        gmail_client.email_fetcher.get_email_details_batch.assert_called_once_with("user123", ["msg1"], detail_level="full")
+    
+    @pytest.mark.asyncio
+    async def test_normalize_messages_preserves_order(self, gmail_client):
+        """Test that batched detail fetches are stitched back in the original order."""
+        gmail_client.email_processor = AsyncMock()
+        gmail_client.email_fetcher = AsyncMock()
+        gmail_client.email_processor.normalize_messages.return_value = []
+        
+        full_message = {"id": "msg2", "payload": {"headers": [], "body": {"size": 0}}}
+        gmail_client.email_fetcher.get_email_details_batch.return_value = [
+            {"id": "msg1", "payload": {}},
+            {"id": "msg3", "payload": {}}
+        ]
+        
+        await gmail_client.normalize_messages(
+            "user123", [{"id": "msg1"}, full_message, {"id": "msg3"}]
+        )
+        
+        gmail_client.email_fetcher.get_email_details_batch.assert_called_once_with("user123", ["msg1", "msg3"], detail_level="full")
+        detailed = gmail_client.email_processor.normalize_messages.call_args[0][1]
+        assert [m["id"] for m in detailed] == ["msg1", "msg2", "msg3"]
+        assert detailed[1] is full_message
+    
+    @pytest.mark.asyncio
+    async def test_normalize_messages_without_bodies_fetches_metadata(self, gmail_client):
+        """Test that bodies=False only fetches metadata for messages without headers."""
+        gmail_client.email_processor = AsyncMock()
+        gmail_client.email_fetcher = AsyncMock()
+        gmail_client.email_processor.normalize_messages.return_value = []
+        
+        metadata_message = {"id": "msg2", "payload": {"headers": [{"name": "Subject", "value": "Hi"}]}}
+        gmail_client.email_fetcher.get_email_details_batch.return_value = [
+            {"id": "msg1", "payload": {"headers": []}}
+        ]
+        
+        await gmail_client.normalize_messages("user123", [{"id": "msg1"}, metadata_message], bodies=False)
+        
+        gmail_client.email_fetcher.get_email_details_batch.assert_called_once_with(
+            "user123", ["msg1"], detail_level="metadata"
+        )
+        detailed = gmail_client.email_processor.normalize_messages.call_args[0][1]
+        assert detailed[1] is metadata_message
+    
+    @pytest.mark.asyncio
+    async def test_get_email_details_batch_chunks_requests(self, gmail_client):
+        """Test that details are fetched in batch_size chunks and returned in order."""
+        gmail_client.batch_size = 2
+        gmail_client.email_fetcher = AsyncMock()
+        gmail_client.email_fetcher.get_email_details_batch.side_effect = (
+            lambda user_id, ids, detail_level: [{"id": message_id} for message_id in ids]
+        )
+        
+        details = await gmail_client.get_email_details_batch("user123", ["a", "b", "c"])
+        
+        assert [d["id"] for d in details] == ["a", "b", "c"]
+        chunks = [c.args[1] for c in gmail_client.email_fetcher.get_email_details_batch.call_args_list]
+        assert chunks == [["a", "b"], ["c"]]
+    
+    @pytest.mark.asyncio
+    async def test_get_email_details_batch_backs_off_on_rate_limit(self, gmail_client):
+        """Test that rate limited batches are retried with halved concurrency."""
+        from shared.exceptions import RateLimitError
+        gmail_client.batch_size = 1
+        gmail_client.max_concurrency = 4
+        gmail_client.email_fetcher = AsyncMock()
+        calls = []
+        
+        async def fetch(user_id, ids, detail_level="full"):
+            calls.append(ids[0])
+            if ids[0] == "b" and calls.count("b") == 1:
+                raise RateLimitError("Gmail API rate limit exceeded")
+            return [{"id": ids[0]}]
+        
+        gmail_client.email_fetcher.get_email_details_batch.side_effect = fetch
+        
+        with patch("services.email_service.src.gmail_client.asyncio.sleep") as mock_sleep:
+            details = await gmail_client.get_email_details_batch("user123", ["a", "b", "c"])
+        
+        assert [d["id"] for d in details] == ["a", "b", "c"]
+        assert calls.count("b") == 2
+        mock_sleep.assert_called_once_with(gmail_client.retry_delay)
+        # Halved to 2 on the rate limit, then +0.5 after the clean retry round
+        assert gmail_client._detail_concurrency["user123"] == 2.5
+    
+    @pytest.mark.asyncio
+    async def test_get_email_details_batch_backs_off_per_user(self, gmail_client):
+        """Test that one user's rate limits do not throttle another user's concurrent fetch."""
+        from shared.exceptions import RateLimitError
+        gmail_client.batch_size = 1
+        gmail_client.max_concurrency = 4
+        gmail_client.email_fetcher = AsyncMock()
+        running = {"user123": 0, "user456": 0}
+        peak = {"user123": 0, "user456": 0}
+        limited = set()
+        
+        async def fetch(user_id, ids, detail_level="full"):
+            running[user_id] += 1
+            peak[user_id] = max(peak[user_id], running[user_id])
+            await asyncio.sleep(0)
+            running[user_id] -= 1
+            if user_id == "user123" and ids[0] not in limited:
+                limited.add(ids[0])
+                raise RateLimitError("Gmail API rate limit exceeded")
+            return [{"id": ids[0]}]
+        
+        gmail_client.email_fetcher.get_email_details_batch.side_effect = fetch
+        gmail_client.retry_delay = 0
+        
+        limited_details, other_details = await asyncio.gather(
+            gmail_client.get_email_details_batch("user123", ["a", "b", "c", "d"]),
+            gmail_client.get_email_details_batch("user456", ["e", "f", "g", "h"])
+        )
+        
+        assert [d["id"] for d in limited_details] == ["a", "b", "c", "d"]
+        assert [d["id"] for d in other_details] == ["e", "f", "g", "h"]
+        assert gmail_client._detail_concurrency["user123"] == 2.5
+        assert gmail_client._detail_concurrency["user456"] == 4.0
+        assert peak["user456"] == 4
+    
+    @pytest.mark.asyncio
+    async def test_normalize_messages_reuses_cached_results(self, gmail_client):
+        """Test that unchanged messages (same id and historyId) are not normalized twice."""
+        gmail_client.email_processor = AsyncMock()
+        gmail_client.email_processor.normalize_messages.side_effect = (
+            lambda user_id, messages: [SimpleNamespace(id=m["id"]) for m in messages]
+        )
+        payload = {"body": {"size": 0}}
+        first_batch = [
+            {"id": "msg1", "historyId": "1", "payload": payload},
+            {"id": "msg2", "historyId": "1", "payload": payload}
+        ]
+        second_batch = [
+            {"id": "msg2", "historyId": "1", "payload": payload},
+            {"id": "msg1", "historyId": "2", "payload": payload}
+        ]
+        
+        await gmail_client.normalize_messages("user123", first_batch)
+        normalized = await gmail_client.normalize_messages("user123", second_batch)
+        
+        assert [m.id for m in normalized] == ["msg2", "msg1"]
+        # Only the message whose historyId changed is normalized again
+        last_call = gmail_client.email_processor.normalize_messages.call_args
+        assert last_call.args[1] == [second_batch[1]]
+    
+    @pytest.mark.asyncio
+    async def test_normalize_messages_skips_cache_without_history_id(self, gmail_client):
+        """Test that messages lacking a historyId are normalized every time."""
+        gmail_client.email_processor = AsyncMock()
+        gmail_client.email_processor.normalize_messages.side_effect = (
+            lambda user_id, messages: [SimpleNamespace(id=m["id"]) for m in messages]
+        )
+        batch = [{"id": "msg1", "payload": {"body": {"size": 0}}}]
+        
+        await gmail_client.normalize_messages("user123", batch)
+        normalized = await gmail_client.normalize_messages("user123", batch)
+        
+        assert [m.id for m in normalized] == ["msg1"]
+        assert gmail_client.email_processor.normalize_messages.call_count == 2
+        assert len(gmail_client.normalized_cache) == 0
+    
+    @pytest.mark.asyncio
+    async def test_iter_normalized_messages_chunks_by_batch_size(self, gmail_client):
+        """Test that streamed messages are normalized one batch at a time."""
+        gmail_client.batch_size = 2
+        gmail_client.email_processor = AsyncMock()
+        gmail_client.email_processor.normalize_messages.side_effect = (
+            lambda user_id, messages: [SimpleNamespace(id=m["id"]) for m in messages]
+        )
+        
+        async def stream():
+            for i in range(5):
+                yield {"id": f"msg{i}", "payload": {"body": {"size": 0}}}
+        
+        normalized = [m async for m in gmail_client.iter_normalized_messages("user123", stream())]
+        
+        assert [m.id for m in normalized] == ["msg0", "msg1", "msg2", "msg3", "msg4"]
+        batch_sizes = [len(c.args[1]) for c in gmail_client.email_processor.normalize_messages.call_args_list]
+        assert batch_sizes == [2, 2, 1]
+    
+    @pytest.mark.asyncio
+    async def test_iter_batches_groups_stream(self, gmail_client):
+        """Test that a message stream is grouped into batches of the requested size."""
+        async def stream():
+            for i in range(5):
+                yield {"id": f"msg{i}"}
+        
+        batches = [batch async for batch in gmail_client.iter_batches(stream(), 3)]
+        
+        assert [[m["id"] for m in batch] for batch in batches] == [["msg0", "msg1", "msg2"], ["msg3", "msg4"]]
+    
+    @pytest.mark.asyncio
+    async def test_email_details_batch_uses_cache(self, gmail_client, mock_api_client):
+        """Test that cached message details are not fetched again."""
+        mock_api_client.get_email_details_batch.return_value = [
+            {"id": "msg1", "payload": {}},
+            {"id": "msg2", "payload": {}}
+        ]
+        fetcher = gmail_client.email_fetcher
+        
+        first = await fetcher.get_email_details_batch("user123", ["msg1", "msg2"])
+        mock_api_client.get_email_details_batch.return_value = [{"id": "msg3", "payload": {}}]
+        second = await fetcher.get_email_details_batch("user123", ["msg2", "msg3"])
+        
+        assert [m["id"] for m in first] == ["msg1", "msg2"]
+        assert [m["id"] for m in second] == ["msg2", "msg3"]
+        mock_api_client.get_email_details_batch.assert_called_with("user123", ["msg3"], detail_level="full")
+        assert mock_api_client.get_email_details_batch.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_email_details_batch_resumes_after_rate_limit(self, gmail_client, mock_api_client):
+        """Test that messages fetched before a rate limit are not requested again on retry."""
+        mock_api_client.get_email_details_batch.side_effect = [
+            RateLimitError("quota exceeded", details={"messages": {"msg1": {"id": "msg1", "payload": {}}}}),
+            [{"id": "msg2", "payload": {}}]
+        ]
+        fetcher = gmail_client.email_fetcher
+        
+        with pytest.raises(RateLimitError):
+            await fetcher.get_email_details_batch("user123", ["msg1", "msg2"])
+        details = await fetcher.get_email_details_batch("user123", ["msg1", "msg2"])
+        
+        assert [m["id"] for m in details] == ["msg1", "msg2"]
+        mock_api_client.get_email_details_batch.assert_called_with("user123", ["msg2"], detail_level="full")
+    
+    @pytest.mark.asyncio
+    async def test_processor_normalizes_in_executor(self):
+        """Test that the processor normalizes chunks in the given executor, preserving order."""
+        from concurrent.futures import ThreadPoolExecutor
+        from services.email_service.src.providers.gmail_email_processor import GmailEmailProcessor
+        
+        messages = [
+            {
+                "id": f"msg{i}",
+                "threadId": f"thread{i}",
+                "payload": {
+                    "mimeType": "text/plain",
+                    "headers": [
+                        {"name": "Subject", "value": f"Subject {i}"},
+                        {"name": "From", "value": "Sender <sender@example.com>"},
+                        {"name": "Date", "value": "Fri, 25 Apr 2025 12:00:00 +0000"}
+                    ],
+                    "body": {"data": base64.urlsafe_b64encode(f"Body {i}".encode()).decode()}
+                }
+            }
+            for i in range(5)
+        ]
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            processor = GmailEmailProcessor(executor=executor, max_chunks=2)
+            normalized = await processor.normalize_messages("user123", messages + [{}])
+        
+        assert [m.id for m in normalized] == [f"msg{i}" for i in range(5)]
+        assert normalized[3].text_content == "Body 3"
+        assert normalized[0].from_address.email == "sender@example.com"
+    
+    @pytest.mark.asyncio
+    async def test_processor_routes_large_messages_to_large_executor(self):
+        """Test that messages above the size threshold use the large-message executor."""
+        from concurrent.futures import ThreadPoolExecutor
+        from services.email_service.src.providers.gmail_email_processor import GmailEmailProcessor
+        
+        messages = [
+            {
+                "id": f"msg{i}",
+                "threadId": f"thread{i}",
+                "sizeEstimate": size,
+                "payload": {
+                    "mimeType": "text/plain",
+                    "headers": [{"name": "Subject", "value": f"Subject {i}"}],
+                    "body": {"data": base64.urlsafe_b64encode(f"Body {i}".encode()).decode()}
+                }
+            }
+            for i, size in enumerate([100, 500_000, 200])
+        ]
+        
+        with ThreadPoolExecutor(max_workers=1) as large_executor:
+            submit = MagicMock(side_effect=large_executor.submit)
+            large_executor.submit = submit
+            processor = GmailEmailProcessor(large_message_executor=large_executor)
+            normalized = await processor.normalize_messages("user123", messages)
+        
+        assert [m.id for m in normalized] == ["msg0", "msg1", "msg2"]
+        assert submit.call_count == 1
+        assert [m["id"] for m in submit.call_args.args[1]] == ["msg1"]
+    
+    def test_large_message_executor_is_passed_to_processor(self, mock_auth_client, mock_rate_limiter):
+        """Test that the client hands its large message executor to the default processor."""
+        large_executor = MagicMock()
+        
+        client = GmailClient(
+            auth_client=mock_auth_client,
+            rate_limiter=mock_rate_limiter,
+            large_message_executor=large_executor
+        )
+        
+        assert client.email_processor.large_message_executor is large_executor
+    
+    @pytest.mark.asyncio
+    async def test_stream_normalized_overlaps_listing_and_normalization(self, gmail_client):
+        """Test that the producer/consumer pipeline normalizes every listed message once."""
+        gmail_client.batch_size = 2
+        gmail_client.max_concurrency = 2
+        gmail_client.email_processor = AsyncMock()
+        gmail_client.email_processor.normalize_messages.side_effect = (
+            lambda user_id, messages: [SimpleNamespace(id=m["id"]) for m in messages]
+        )
+        
+        async def listing(user_id, since_date, max_emails, detail_level=None, labels=None):
+            for i in range(5):
+                yield {"id": f"msg{i}", "payload": {"body": {"size": 0}}}
+        
+        gmail_client.email_fetcher = MagicMock()
+        gmail_client.email_fetcher.iter_emails_since.side_effect = listing
+        
+        normalized = [m async for m in gmail_client.stream_normalized("user123", datetime(2025, 4, 25))]
+        
+        assert sorted(m.id for m in normalized) == ["msg0", "msg1", "msg2", "msg3", "msg4"]
+        batch_sizes = [len(c.args[1]) for c in gmail_client.email_processor.normalize_messages.call_args_list]
+        assert all(size <= 2 for size in batch_sizes)
+    
+    @pytest.mark.asyncio
+    async def test_stream_normalized_without_date_closes_workers_early(self, gmail_client):
+        """Test that streaming without a date lists all emails and early exit stops the workers."""
+        gmail_client.batch_size = 1
+        gmail_client.max_concurrency = 2
+        gmail_client.email_processor = AsyncMock()
+        gmail_client.email_processor.normalize_messages.side_effect = (
+            lambda user_id, messages: [SimpleNamespace(id=m["id"]) for m in messages]
+        )
+        
+        async def listing(user_id, max_emails, labels=None):
+            for i in range(max_emails):
+                yield {"id": f"msg{i}", "payload": {"body": {"size": 0}}}
+        
+        gmail_client.email_fetcher = MagicMock()
+        gmail_client.email_fetcher.iter_all_emails.side_effect = listing
+        
+        tasks_before = asyncio.all_tasks()
+        stream = gmail_client.stream_normalized("user123", max_emails=100)
+        first = await stream.__anext__()
+        await stream.aclose()
+        
+        assert first.id.startswith("msg")
+        assert asyncio.all_tasks() == tasks_before
+        gmail_client.email_fetcher.iter_emails_since.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_get_attachment_wraps_decoded_bytes(self, gmail_client):
+        """Test that attachment bytes from the API client are returned without re-decoding."""
+        gmail_client.attachment_handler.api_client = AsyncMock()
+        gmail_client.attachment_handler.api_client.get_attachment.return_value = b"%PDF-1.4"
+        
+        result = await gmail_client.get_attachment("user123", "msg1", "att1")
+        
+        assert result == {
+            "attachment_id": "att1",
+            "message_id": "msg1",
+            "size": 8,
+            "decoded_data": b"%PDF-1.4",
+        }
+    
+    @pytest.mark.asyncio
+    async def test_iter_emails_since_history_dedupes_added_messages(self, gmail_client, mock_api_client):
+        """Test that history pages are followed and repeated message IDs yielded once."""
+        mock_api_client.list_history.side_effect = [
+            ([{"id": "msg1"}, {"id": "msg2"}, {"id": "msg1"}], "page2"),
+            ([{"id": "msg2"}, {"id": "msg3"}], None)
+        ]
+        
+        stream = gmail_client.iter_emails_since_history("user123", "1000", datetime(2025, 4, 1))
+        emails = [email async for email in stream]
+        
+        assert [email["id"] for email in emails] == ["msg1", "msg2", "msg3"]
+        mock_api_client.get_email_list.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_iter_emails_since_history_falls_back_when_expired(self, gmail_client, mock_api_client):
+        """Test that an expired history ID falls back to the date query."""
+        mock_api_client.list_history.side_effect = ResourceNotFoundError("expired")
+        mock_api_client.get_email_list.return_value = ([{"id": "msg1"}], None)
+        
+        stream = gmail_client.iter_emails_since_history("user123", "1000", datetime(2025, 4, 1))
+        emails = [email async for email in stream]
+        
+        assert [email["id"] for email in emails] == ["msg1"]
+        assert "after:2025/04/01" in mock_api_client.get_email_list.call_args.kwargs["query"]
+    
+    @pytest.mark.asyncio
+    async def test_iter_emails_since_history_fallback_raises_list_errors(self, gmail_client, mock_api_client):
+        """Test that list failures in the date fallback fail the stream instead of ending it."""
+        mock_api_client.list_history.side_effect = ResourceNotFoundError("expired")
+        mock_api_client.get_email_list.side_effect = RateLimitError("quota exceeded")
+        
+        stream = gmail_client.iter_emails_since_history("user123", "1000", datetime(2025, 4, 1))
+        with pytest.raises(RateLimitError):
+            [email async for email in stream]
@@ -10,6 +10,7 @@ from services.email_service.tests.mock_modules import MockEmailMessage
 
 # Now we can safely import the module
 from services.email_service.src.rabbitmq_client import RabbitMQClient
+from shared.exceptions import GmailAutomationError
 
 
 class TestRabbitMQClient:
@@ -24,10 +25,12 @@ class TestRabbitMQClient:
         return mock
     
     @pytest.fixture
-    def mock_channel(self):
+    def mock_channel(self, mock_exchange):
         """Create a mock RabbitMQ channel."""
         mock = AsyncMock()
         mock.declare_queue = AsyncMock()
+        # Pooled publishing channels look the exchange up by name
+        mock.get_exchange = AsyncMock(return_value=mock_exchange)
         return mock
     
     @pytest.fixture
@@ -258,6 +261,7 @@ class TestRabbitMQClient:
             
             # Call the method
             await rabbitmq_client.publish_batch(emails, routing_key="email.batch.test")
+            await rabbitmq_client.wait_for_confirms()
             
             # Verify exchange publish was called
             mock_exchange.publish.assert_called_once()
@@ -282,6 +286,33 @@ class TestRabbitMQClient:
             # Check routing key
             assert routing_key == "email.batch.test"
     
+    @pytest.mark.asyncio
+    async def test_publish_batch_collects_confirms(self, rabbitmq_client):
+        """Test that each caller only sees failures of the batches it published."""
+        mock_exchange = rabbitmq_client._mock_exchange
+        mock_exchange.publish.side_effect = [None, Exception("Not confirmed"), None]
+        rabbitmq_client.max_unconfirmed = 2
+        
+        with patch('services.email_service.src.rabbitmq_client.EmailMessage', MockEmailMessage):
+            email = MockEmailMessage(
+                id="test123",
+                user_id="user123",
+                subject="Test Subject",
+                date=datetime(2025, 4, 24, 10, 0, 0)
+            )
+            
+            # A full window only paces publishing; the failure is not raised here
+            first = await rabbitmq_client.publish_batch([email])
+            failed = await rabbitmq_client.publish_batch([email])
+            other = await rabbitmq_client.publish_batch([email])
+            
+            await rabbitmq_client.wait_for_confirms([first, other])
+            with pytest.raises(GmailAutomationError):
+                await rabbitmq_client.wait_for_confirms([failed])
+            
+            assert mock_exchange.publish.call_count == 3
+            assert rabbitmq_client._unconfirmed == set()
+    
     @pytest.mark.asyncio
     async def test_publish_email_not_initialized(self, mock_connection, mock_channel, mock_exchange):
         """Test publishing when client is not initialized calls initialize first."""
@@ -1,14 +1,16 @@
 import pytest
 import time
-from unittest.mock import patch, MagicMock, call
-from services.email_service.src.rate_limiter import TokenBucketRateLimiter
+from unittest.mock import patch, AsyncMock, MagicMock, call
+from services.email_service.src.rate_limiter import TokenBucketRateLimiter, TOKEN_BUCKET_SCRIPT
 
 class TestTokenBucketRateLimiter:
     """Test cases for the TokenBucketRateLimiter class."""
     
     @pytest.fixture
     def mock_redis(self):
-        mock_redis_instance = MagicMock()
+        mock_redis_instance = AsyncMock()
+        # register_script is synchronous and returns an awaitable script
+        mock_redis_instance.register_script = MagicMock(return_value=AsyncMock(return_value=[1, 100]))
         yield mock_redis_instance
     
     @pytest.fixture
@@ -32,83 +34,44 @@ class TestTokenBucketRateLimiter:
         
     @pytest.mark.asyncio
     async def test_acquire_tokens_success(self, rate_limiter, mock_redis):
-        """Test successfully acquiring tokens."""
-        # Setup initial state with a function-based side_effect
-        mock_redis.set.return_value = True
-        mock_redis.set.reset_mock()
+        """Test successfully acquiring tokens in one script call."""
+        rate_limiter._bucket_script.return_value = [1, 50]
         
-        # Use a function for side_effect to handle multiple calls properly
-        def mock_get_side_effect(key):
-            if key == f'{rate_limiter.bucket_name}:tokens':
-                return '100'
-            elif key == f'{rate_limiter.bucket_name}:last_refill':
-                return str(int(time.time()))
-            return None
-            
-        mock_redis.get.side_effect = mock_get_side_effect
+        with patch('time.time', return_value=12345):
+            result = await rate_limiter.acquire_tokens(50)
         
-        # Should be able to acquire tokens on first try
-        result = await rate_limiter.acquire_tokens(50)
         assert result is True
-        
-        # Verify Redis calls for consuming tokens
-        mock_redis.set.assert_called_with(f'{rate_limiter.bucket_name}:tokens', '50', ex=None)
+        rate_limiter._bucket_script.assert_awaited_once_with(
+            keys=[f'{rate_limiter.bucket_name}:tokens', f'{rate_limiter.bucket_name}:last_refill'],
+            args=[12345, 100, 10, 1, 50]
+        )
+        # The refill and the take happen inside the script
+        mock_redis.get.assert_not_called()
+        mock_redis.set.assert_not_called()
     
     @pytest.mark.asyncio
     async def test_acquire_tokens_insufficient(self, rate_limiter, mock_redis):
         """Test when there are insufficient tokens."""
-        # Setup initial state with a function-based side_effect
-        mock_redis.set.reset_mock()
-        
-        # Use a function for side_effect to handle multiple calls properly
-        def mock_get_side_effect(key):
-            if key == f'{rate_limiter.bucket_name}:tokens':
-                return '30'
-            elif key == f'{rate_limiter.bucket_name}:last_refill':
-                return str(int(time.time()))
-            return None
-            
-        mock_redis.get.side_effect = mock_get_side_effect
+        rate_limiter._bucket_script.return_value = [0, 30]
         
         # Trying to acquire 50 tokens should fail
         result = await rate_limiter.acquire_tokens(50)
         assert result is False
         
-        # Verify no tokens were consumed (no set call for tokens)
+        # Verify no tokens were consumed outside the script
         assert mock_redis.set.call_count == 0
     
     @pytest.mark.asyncio
-    async def test_refill_tokens(self, rate_limiter, mock_redis):
-        """Test token refill mechanism."""
-        # Setup initial state for refill test
-        current_time = int(time.time())
-        last_refill_time = current_time - 10  # 10 seconds ago
-        
-        # Reset side_effect and return_value to avoid StopIteration
-        mock_redis.get.side_effect = None
-        mock_redis.set.reset_mock()
-        
-        # Setup get calls with different returns for different keys
-        def mock_get_side_effect(key):
-            if key == f'{rate_limiter.bucket_name}:tokens':
-                return '50'
-            elif key == f'{rate_limiter.bucket_name}:last_refill':
-                return str(last_refill_time)
-            return None
-            
-        mock_redis.get.side_effect = mock_get_side_effect
-        mock_redis.set.return_value = True
-        
-        # Call refill_tokens
-        await rate_limiter._refill_tokens()
+    async def test_available_tokens_refills_without_taking(self, rate_limiter):
+        """Test that checking the available tokens runs the script with no cost."""
+        rate_limiter._bucket_script.return_value = [1, 100]
         
-        # Should add 10 tokens/second * 10 seconds = 100 tokens
-        # But max is 100, so should be 100
-        mock_redis.set.assert_any_call(
-            f'{rate_limiter.bucket_name}:tokens', 
-            '100',  # Refilled to max
-            ex=None
-        )
+        assert await rate_limiter.available_tokens() == 100
+        assert rate_limiter._bucket_script.call_args.kwargs["args"][-1] == 0
+    
+    def test_bucket_script_registered_once(self, rate_limiter, mock_redis):
+        """Test that the token bucket script is registered when the limiter is created."""
+        mock_redis.register_script.assert_called_once_with(TOKEN_BUCKET_SCRIPT)
     
     @pytest.mark.asyncio
     async def test_reset_bucket(self, rate_limiter, mock_redis):
@@ -126,4 +89,27 @@ class TestTokenBucketRateLimiter:
                 call(f'{rate_limiter.bucket_name}:tokens', '100', ex=None),
                 call(f'{rate_limiter.bucket_name}:last_refill', '12345', ex=None)
             ]
-            mock_redis.set.assert_has_calls(expected_calls, any_order=True)
\ No newline at end of file
+            mock_redis.set.assert_has_calls(expected_calls, any_order=True)
+    
+    @pytest.mark.asyncio
+    async def test_wait_for_tokens(self, rate_limiter):
+        """Test waiting until the bucket has refilled enough tokens."""
+        with patch.object(rate_limiter, 'available_tokens', side_effect=[0, 5, 20]) as mock_available, \
+                patch('services.email_service.src.rate_limiter.asyncio.sleep') as mock_sleep:
+            await rate_limiter.wait_for_tokens(10)
+        
+        assert mock_available.call_count == 3
+        assert mock_sleep.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_release_tokens_caps_at_max(self, rate_limiter, mock_redis):
+        """Test that released tokens go through the bucket script, which caps them at max_tokens."""
+        rate_limiter._bucket_script.return_value = [1, 100]
+        
+        await rate_limiter.release_tokens(10)
+        
+        args = rate_limiter._bucket_script.call_args.kwargs['args']
+        assert args[1] == rate_limiter.max_tokens
+        assert args[-1] == -10
+        mock_redis.get.assert_not_called()
+        mock_redis.set.assert_not_called()
@@ -1,7 +1,7 @@
 import pytest
 import json
-from unittest.mock import AsyncMock, MagicMock, patch
-from datetime import datetime
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
+from datetime import datetime, timedelta
 import redis.asyncio as redis
 from services.email_service.src.sync_state import SyncStateManager
 from services.email_service.src.interfaces.polling_strategy import PollingStrategy
@@ -206,6 +206,65 @@ class TestSyncStateManager:
         assert data[1]["batch_size"] == 100  # Our new entry
         assert "timestamp" in data[1]  # Should have a timestamp
     
+    @pytest.mark.asyncio
+    async def test_save_progress_pipelines_checkpoint(self, sync_manager, mock_redis):
+        """Test that the checkpoint write and metrics read share one pipeline."""
+        existing_metrics = [{"batch_size": 50, "timestamp": "2025-04-23T10:00:00"}]
+        pipe = MagicMock()
+        pipe.__aenter__.return_value = pipe
+        pipe.execute = AsyncMock(return_value=[True, json.dumps(existing_metrics)])
+        mock_redis.pipeline = MagicMock(return_value=pipe)
+        
+        result = await sync_manager.save_progress("test_user", "msg123", {"batch_size": 100})
+        
+        assert result is True
+        assert pipe.set.call_args[0][0] == "test:test_user:last_message"
+        assert json.loads(pipe.set.call_args[0][1])["message_id"] == "msg123"
+        pipe.get.assert_called_once_with("test:test_user:metrics")
+        pipe.execute.assert_awaited_once()
+        
+        # Only the metrics write is left outside the pipeline
+        mock_redis.set.assert_called_once()
+        key, data = mock_redis.set.call_args[0]
+        assert key == "test:test_user:metrics"
+        assert [m["batch_size"] for m in json.loads(data)] == [50, 100]
+    
+    @pytest.mark.asyncio
+    async def test_history_id_round_trip(self, sync_manager, mock_redis):
+        """Test that the mailbox history ID is stored under its own key."""
+        assert await sync_manager.save_history_id("test_user", "12345") is True
+        mock_redis.set.assert_called_once_with("test:test_user:history_id", "12345")
+        
+        mock_redis.get.return_value = "12345"
+        assert await sync_manager.get_history_id("test_user") == "12345"
+        mock_redis.get.assert_called_once_with("test:test_user:history_id")
+    
+    @pytest.mark.asyncio
+    async def test_filter_unpublished_keeps_new_ids_in_order(self, sync_manager, mock_redis):
+        """Test that IDs already recorded as published are dropped with one ZMSCORE."""
+        mock_redis.zmscore = AsyncMock(return_value=[None, 1714000000.0, None])
+        
+        result = await sync_manager.filter_unpublished("test_user", ["msg1", "msg2", "msg3"])
+        
+        assert result == ["msg1", "msg3"]
+        mock_redis.zmscore.assert_called_once_with("test:test_user:published", ["msg1", "msg2", "msg3"])
+    
+    @pytest.mark.asyncio
+    async def test_mark_published_prunes_old_ids(self, sync_manager, mock_redis):
+        """Test that published IDs are recorded and expired ones pruned in one pipeline."""
+        pipe = MagicMock()
+        pipe.__aenter__.return_value = pipe
+        pipe.execute = AsyncMock(return_value=[2, 0, True])
+        mock_redis.pipeline = MagicMock(return_value=pipe)
+        
+        with patch('services.email_service.src.sync_state.time.time', return_value=1_000_000):
+            result = await sync_manager.mark_published("test_user", ["msg1", "msg2"], timedelta(days=1))
+        
+        assert result is True
+        pipe.zadd.assert_called_once_with("test:test_user:published", {"msg1": 1_000_000, "msg2": 1_000_000})
+        pipe.zremrangebyscore.assert_called_once_with("test:test_user:published", "-inf", 1_000_000 - 86400)
+        pipe.execute.assert_awaited_once()
+    
     @pytest.mark.asyncio
     async def test_get_sync_metrics(self, sync_manager, mock_redis):
         """Test retrieving sync metrics history."""
@@ -332,6 +391,112 @@ class TestSyncStateManager:
         # Verify the result matches our mock status
         assert result == mock_status
     
+    @pytest.mark.asyncio
+    async def test_claim_ingestion(self, sync_manager, mock_redis):
+        """Test that an ingestion is claimed with an expiring per-user key owned by this manager."""
+        status = {"user_id": "test_user", "status": "starting"}
+        mock_redis.eval = AsyncMock(side_effect=[1, 0])
+        
+        first = await sync_manager.claim_ingestion("test_user", status)
+        second = await sync_manager.claim_ingestion("test_user", status)
+        
+        assert first is True
+        assert second is False
+        args = mock_redis.eval.call_args[0]
+        assert "'NX', 'EX'" in args[0]
+        assert args[1:4] == (2, "test:test_user:ingestion_claim", "test:ingestions")
+        assert args[4:7] == (sync_manager.owner_id, sync_manager.claim_ttl, "test_user")
+        assert json.loads(args[7]) == status
+    
+    @pytest.mark.asyncio
+    async def test_save_ingestion_status_requires_claim(self, sync_manager, mock_redis):
+        """Test that a status is only saved, and the lease renewed, while this manager holds the claim."""
+        status = {"user_id": "test_user", "status": "running"}
+        mock_redis.eval = AsyncMock(side_effect=[1, 0])
+        
+        saved = await sync_manager.save_ingestion_status("test_user", status)
+        released = await sync_manager.save_ingestion_status("test_user", status)
+        
+        assert saved is True
+        assert released is False
+        args = mock_redis.eval.call_args[0]
+        assert "EXPIRE" in args[0]
+        assert args[1:4] == (2, "test:test_user:ingestion_claim", "test:ingestions")
+        assert args[4:7] == (sync_manager.owner_id, sync_manager.claim_ttl, "test_user")
+        assert json.loads(args[7]) == status
+    
+    @pytest.mark.asyncio
+    async def test_release_ingestion_claim_checks_owner(self, sync_manager, mock_redis):
+        """Test that only the claim's owner releases it, leaving the status in place."""
+        mock_redis.eval = AsyncMock(side_effect=[1, 0])
+        
+        released = await sync_manager.release_ingestion_claim("test_user")
+        not_owned = await sync_manager.release_ingestion_claim("test_user")
+        
+        assert released is True
+        assert not_owned is False
+        mock_redis.eval.assert_called_with(
+            ANY, 1, "test:test_user:ingestion_claim", sync_manager.owner_id
+        )
+        mock_redis.hdel.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_get_and_delete_ingestion_status(self, sync_manager, mock_redis):
+        """Test reading a user's ingestion status and removing it with its claim."""
+        status = {"user_id": "test_user", "status": "running", "emails_processed": 10}
+        mock_redis.hget = AsyncMock(return_value=json.dumps(status))
+        pipe = MagicMock()
+        pipe.__aenter__.return_value = pipe
+        pipe.execute = AsyncMock(return_value=[1, 0])
+        mock_redis.pipeline = MagicMock(return_value=pipe)
+        
+        result = await sync_manager.get_ingestion_status("test_user")
+        released = await sync_manager.delete_ingestion_status("test_user")
+        
+        assert result == status
+        assert released is True
+        mock_redis.hget.assert_called_once_with("test:ingestions", "test_user")
+        pipe.hdel.assert_called_once_with("test:ingestions", "test_user")
+        pipe.delete.assert_called_once_with("test:test_user:ingestion_claim")
+    
+    @pytest.mark.asyncio
+    async def test_ingestion_stops_are_broadcast(self, sync_manager, mock_redis):
+        """Test that stopped ingestions are published and yielded to subscribers."""
+        mock_redis.publish = AsyncMock(return_value=2)
+        
+        async def listen():
+            yield {"type": "message", "data": "test_user"}
+        
+        pubsub = AsyncMock()
+        pubsub.listen = MagicMock(return_value=listen())
+        mock_redis.pubsub = MagicMock(return_value=pubsub)
+        
+        receivers = await sync_manager.publish_ingestion_stop("test_user")
+        stopped = [user_id async for user_id in sync_manager.listen_ingestion_stops()]
+        
+        assert receivers == 2
+        mock_redis.publish.assert_called_once_with("test:ingestion_stops", "test_user")
+        pubsub.subscribe.assert_called_once_with("test:ingestion_stops")
+        assert stopped == ["test_user"]
+        pubsub.close.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_initialize_with_shared_connection_pool(self, mock_redis, mock_polling_strategy):
+        """Test that an injected connection pool is used instead of a URL-built client."""
+        pool = MagicMock()
+        with patch('redis.asyncio.Redis', return_value=mock_redis) as redis_cls, \
+                patch('redis.asyncio.from_url') as from_url:
+            manager = SyncStateManager(
+                "redis://test:6379/0",
+                polling_strategy=mock_polling_strategy,
+                connection_pool=pool
+            )
+            await manager.initialize()
+        
+        redis_cls.assert_called_once_with(connection_pool=pool)
+        from_url.assert_not_called()
+        mock_redis.ping.assert_called_once()
+    
     @pytest.mark.asyncio
     async def test_initialize_exception(self, mock_polling_strategy):
         """Test handling exception during initialization."""
@@ -17,7 +17,10 @@ class AuthClient:
     Client for interacting with the Authentication Service.
     
     This class handles communication with the Auth Service for operations like
-    retrieving user tokens.
+    retrieving user tokens. Requests share one pooled HTTP client so repeated
+    token fetches reuse keep-alive connections instead of paying a new TCP
+    handshake each time; call aclose() (or use the client as an async context
+    manager) to release it.
     
     Attributes:
         base_url: Base URL for the Auth Service
@@ -34,8 +37,38 @@ class AuthClient:
         """
         self.base_url = base_url or os.getenv("AUTH_SERVICE_URL", "http://auth-service:8000")
         self.token_manager = TokenManager(buffer_seconds=buffer_seconds)
+        self._http: Optional[httpx.AsyncClient] = None
         logger.info(f"Auth client initialized with base URL: {self.base_url}")
     
+    async def __aenter__(self) -> "AuthClient":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """
+        Get the shared HTTP client, creating it on first use.
+        
+        Returns:
+            Pooled httpx.AsyncClient with keep-alive connections
+        """
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=50,
+                    max_keepalive_connections=20,
+                    keepalive_expiry=60
+                )
+            )
+        return self._http
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and its pooled connections."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+    
     async def _fetch_and_cache_token(
         self, 
         user_id: str, 
@@ -64,20 +97,20 @@ class AuthClient:
         url = f"{self.base_url}{endpoint}"
         
         try:
-            async with httpx.AsyncClient() as client:
-                logger.info(f"{log_message} for user {user_id}")
-                
-                # Dynamically choose the HTTP method
-                if (http_method.lower() == "post"):
-                    response = await client.post(url)
-                else:
-                    response = await client.get(url)
-                
-                response.raise_for_status()
-                token_data = response.json()
-                
-                # Cache the token and return it
-                return self.token_manager.cache_token(user_id, token_data)
+            client = self._get_http_client()
+            logger.info(f"{log_message} for user {user_id}")
+            
+            # Dynamically choose the HTTP method
+            if (http_method.lower() == "post"):
+                response = await client.post(url)
+            else:
+                response = await client.get(url)
+            
+            response.raise_for_status()
+            token_data = response.json()
+            
+            # Cache the token and return it
+            return self.token_manager.cache_token(user_id, token_data)
         except Exception as e:
             logger.error(f"Error fetching token for user {user_id}: {str(e)}")
             raise
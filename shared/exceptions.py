@@ -29,7 +29,9 @@ class ResourceNotFoundError(GmailAutomationError):
 
 class RateLimitError(ExternalServiceError):
     """Raised specifically for rate limiting errors from external services."""
-    pass
+    def __init__(self, message: str, service: str = None, details: dict = None, retry_after: float = None):
+        super().__init__(message, service, details)
+        self.retry_after = retry_after
 
 class EmailProcessingError(GmailAutomationError):
     """Raised for errors during the processing or normalization of emails."""
@@ -0,0 +1,41 @@
+"""
+Helpers for running coroutines concurrently with a bound.
+
+Unbounded asyncio.gather over hundreds of API calls trips rate limits and
+exhausts connections; these helpers cap how many run at once while still
+returning results in input order.
+"""
+import asyncio
+from typing import Any, Awaitable, List
+
+
+async def gather_with_concurrency(
+    limit: int,
+    *aws: Awaitable[Any],
+    return_exceptions: bool = False
+) -> List[Any]:
+    """
+    Await the given awaitables with at most `limit` running at the same time.
+
+    Args:
+        limit: Maximum number of awaitables in flight at once
+        *aws: Awaitables to run
+        return_exceptions: Return exceptions as results instead of raising
+            the first one, as in asyncio.gather (default: False)
+
+    Returns:
+        Results in the same order as the awaitables
+    """
+    if limit <= 0:
+        raise ValueError("limit must be positive")
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _bounded(aw: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(
+        *(_bounded(aw) for aw in aws),
+        return_exceptions=return_exceptions
+    )
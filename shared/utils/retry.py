@@ -6,9 +6,12 @@ to implement retry logic with exponential backoff.
 """
 import asyncio
 import functools
+import json
 import logging
-from typing import Any, Callable, Optional, Type, TypeVar, cast
+import random
+from typing import Any, Callable, Optional, Type, TypeVar, Union, cast
 from googleapiclient.errors import HttpError
+from shared.exceptions import RateLimitError
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -16,24 +19,78 @@ logger = logging.getLogger(__name__)
 # Type variable for the decorated function
 F = TypeVar('F', bound=Callable[..., Any])
 
+# Google APIs report quota exhaustion as 403 with one of these reasons
+RATE_LIMIT_REASONS = frozenset({'rateLimitExceeded', 'userRateLimitExceeded'})
+
+# Upper bound on a computed backoff delay, in seconds
+MAX_RETRY_DELAY = 60
+
+
+def is_rate_limit_response(status: int, content: Union[bytes, str, None]) -> bool:
+    """
+    Check whether a Google API error response means the caller is rate limited.
+    
+    Args:
+        status: HTTP status code
+        content: Response body, expected to be Google's JSON error document
+    
+    Returns:
+        True for 429 responses and 403 responses with a rate limit reason
+    """
+    if status == 429:
+        return True
+    if status != 403 or not content:
+        return False
+    try:
+        error = json.loads(content).get('error', {})
+    except (ValueError, AttributeError):
+        return False
+    if not isinstance(error, dict):
+        return False
+    return any(
+        isinstance(item, dict) and item.get('reason') in RATE_LIMIT_REASONS
+        for item in error.get('errors', [])
+    )
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given in seconds.
+    
+    Args:
+        value: Header value, or None when the header is absent
+    
+    Returns:
+        Delay in seconds, or None if the header is absent or not numeric
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
 def async_retry_on_rate_limit(
     max_retries: int = 5,
     base_delay: int = 1,
     rate_limit_codes: tuple = (429,),
-    exception_types: tuple = (HttpError,)
+    exception_types: tuple = (HttpError, RateLimitError)
 ) -> Callable[[F], F]:
     """
     Decorator for retrying async functions when rate limited.
     
     This decorator implements retry logic with exponential backoff
-    for async functions that might encounter rate limiting.
+    for async functions that might encounter rate limiting. When the server
+    sends a Retry-After delay it is used instead of the computed backoff, and
+    random jitter is added so concurrent callers do not retry in lockstep.
     
     Args:
         max_retries: Maximum number of retry attempts (default: 5)
         base_delay: Base delay in seconds between retries (default: 1)
         rate_limit_codes: HTTP status codes to retry on (default: 429)
         exception_types: Exception types to catch and potentially retry
-                         (default: HttpError)
+                         (default: HttpError and RateLimitError)
     
     Returns:
         Decorated function with retry logic
@@ -46,10 +103,18 @@ def async_retry_on_rate_limit(
                     # Attempt to call the function
                     return await func(*args, **kwargs)
                 except exception_types as error:
+                    retry_after = None
                     # For HttpError, check if it's a rate limit response
                     if isinstance(error, HttpError):
                         status = error.resp.status
-                        is_rate_limit = status in rate_limit_codes
+                        is_rate_limit = (
+                            status in rate_limit_codes
+                            or is_rate_limit_response(status, error.content)
+                        )
+                        retry_after = parse_retry_after(error.resp.get('retry-after'))
+                    elif isinstance(error, RateLimitError):
+                        is_rate_limit = True
+                        retry_after = error.retry_after
                     else:
                         # For other exceptions, we can't determine if it's rate-limiting
                         # so we'll just retry as per the decorator configuration
@@ -60,13 +125,17 @@ def async_retry_on_rate_limit(
                         logger.error(f"Error in {func.__name__}: {error}")
                         raise
                     
-                    # Calculate delay with exponential backoff
-                    retry_delay = base_delay * (2 ** attempt)
+                    # Prefer the server's hint, otherwise back off exponentially
+                    if retry_after is not None:
+                        retry_delay = retry_after
+                    else:
+                        retry_delay = min(base_delay * (2 ** attempt), MAX_RETRY_DELAY)
+                    retry_delay += random.uniform(0, 0.5 * retry_delay)
                     
                     # Log and wait before retrying
                     logger.warning(
                         f"Request rate limited. Retrying {func.__name__} "
-                        f"in {retry_delay} seconds (attempt {attempt + 1}/{max_retries})"
+                        f"in {retry_delay:.2f} seconds (attempt {attempt + 1}/{max_retries})"
                     )
                     await asyncio.sleep(retry_delay)
             
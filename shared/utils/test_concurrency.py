@@ -0,0 +1,45 @@
+"""
+Tests for the bounded gather helper.
+"""
+import pytest
+import asyncio
+from shared.utils.concurrency import gather_with_concurrency
+
+@pytest.mark.asyncio
+async def test_gather_with_concurrency_limits_in_flight():
+    """Test that no more than `limit` awaitables run at once and order is kept."""
+    in_flight = 0
+    peak = 0
+
+    async def work(value):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01 * (5 - value))
+        in_flight -= 1
+        return value
+
+    results = await gather_with_concurrency(2, *(work(i) for i in range(5)))
+
+    assert results == [0, 1, 2, 3, 4]
+    assert peak == 2
+
+@pytest.mark.asyncio
+async def test_gather_with_concurrency_return_exceptions():
+    """Test that failures can be returned in place of results."""
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def succeed():
+        return "ok"
+
+    results = await gather_with_concurrency(1, succeed(), fail(), return_exceptions=True)
+
+    assert results[0] == "ok"
+    assert isinstance(results[1], RuntimeError)
+
+@pytest.mark.asyncio
+async def test_gather_with_concurrency_invalid_limit():
+    """Test that a non-positive limit is rejected."""
+    with pytest.raises(ValueError):
+        await gather_with_concurrency(0)
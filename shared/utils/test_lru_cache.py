@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import patch
+from shared.utils.lru_cache import LRUCache
+
+class TestLRUCache:
+    """Test cases for the LRUCache class."""
+
+    def test_get_missing_returns_default(self):
+        """Test that missing keys return the default value."""
+        cache = LRUCache(maxsize=2)
+        assert cache.get("missing") is None
+        assert cache.get("missing", "default") == "default"
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used entry is evicted when full."""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        # Touch "a" so "b" becomes the least recently used entry
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+        assert len(cache) == 2
+
+    def test_ttl_expiry(self):
+        """Test that entries older than the TTL are treated as missing."""
+        cache = LRUCache(maxsize=2, ttl=30)
+
+        with patch("shared.utils.lru_cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1)
+        with patch("shared.utils.lru_cache.time.monotonic", return_value=129.0):
+            assert cache.get("a") == 1
+        with patch("shared.utils.lru_cache.time.monotonic", return_value=130.0):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_pop_and_clear(self):
+        """Test removing entries."""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        assert cache.pop("a") == 1
+        assert cache.pop("a", "gone") == "gone"
+
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_invalid_maxsize(self):
+        """Test that a non-positive maxsize is rejected."""
+        with pytest.raises(ValueError):
+            LRUCache(maxsize=0)
@@ -5,7 +5,8 @@ import pytest
 import asyncio
 from unittest.mock import MagicMock, patch
 from googleapiclient.errors import HttpError
-from shared.utils.retry import async_retry_on_rate_limit
+from shared.exceptions import RateLimitError
+from shared.utils.retry import async_retry_on_rate_limit, is_rate_limit_response, parse_retry_after
 
 # Mock HttpError for testing
 class MockHttpError(HttpError):
@@ -112,4 +113,39 @@ async def test_retry_on_rate_limit_max_retries_exceeded():
             await decorated("arg1", kwarg1="kwarg1")
         
         # Check that the function was called 3 times
-        assert mock_func.call_count == 3
\ No newline at end of file
+        assert mock_func.call_count == 3
+
+@pytest.mark.asyncio
+async def test_retry_on_rate_limit_honors_retry_after():
+    """Test that a RateLimitError's retry_after replaces the exponential backoff."""
+    calls = []
+    
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RateLimitError("rate limited", retry_after=7)
+        return "ok"
+    
+    sleep_mock = MagicMock(side_effect=mock_sleep)
+    with patch('asyncio.sleep', sleep_mock), patch('shared.utils.retry.random.uniform', return_value=0):
+        result = await async_retry_on_rate_limit(max_retries=2, base_delay=1)(flaky)()
+    
+    assert result == "ok"
+    sleep_mock.assert_called_once_with(7)
+
+def test_is_rate_limit_response():
+    """Test that 429s and quota 403s count as rate limiting, other 403s do not."""
+    quota = b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}'
+    forbidden = b'{"error": {"errors": [{"reason": "insufficientPermissions"}]}}'
+    
+    assert is_rate_limit_response(429, b'')
+    assert is_rate_limit_response(403, quota)
+    assert not is_rate_limit_response(403, forbidden)
+    assert not is_rate_limit_response(403, b'not json')
+    assert not is_rate_limit_response(500, quota)
+
+def test_parse_retry_after():
+    """Test parsing Retry-After values given in seconds."""
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""
+Tests for text utilities.
+"""
+from unittest.mock import patch
+from shared.utils.text_utils import html_to_text
+
+HTML_CONTENT = (
+    "<html><head><style>p { color: red; }</style></head>"
+    "<body><h1>Title</h1><p>Hello&nbsp;&amp; welcome</p>"
+    "<script>alert('x');</script><div>Line<br/>break</div></body></html>"
+)
+
+def test_html_to_text_strips_tags_scripts_and_entities():
+    """Test that markup, scripts and styles are removed and entities decoded."""
+    assert html_to_text(HTML_CONTENT) == "Title Hello & welcome Line break"
+
+def test_html_to_text_regex_fallback():
+    """Test the regex path used when selectolax is not installed."""
+    with patch("shared.utils.text_utils.LexborHTMLParser", None):
+        assert html_to_text(HTML_CONTENT) == "Title Hello & welcome Line break"
+
+def test_html_to_text_empty():
+    """Test that empty input returns an empty string."""
+    assert html_to_text("") == ""
+    assert html_to_text(None) == ""
@@ -2,6 +2,18 @@ import re
 import html
 from typing import Optional
 
+try:
+    # Optional C parser (lexbor); much faster than regex on large bodies
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# Patterns are compiled once; html_to_text runs for every HTML-only email body
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style).*?</\1>', re.DOTALL)
+_BR_RE = re.compile(r'<br[^>]*>')
+_BLOCK_END_RE = re.compile(r'</(p|div|h\d)>')
+_TAG_RE = re.compile(r'<[^>]*>')
+
 def html_to_text(html_content: Optional[str]) -> str:
     """
     Convert HTML content to plain text, preserving important formatting.
@@ -10,6 +22,9 @@ def html_to_text(html_content: Optional[str]) -> str:
     plain text version, handling common elements like paragraphs, line breaks,
     and removing scripts and styles.
     
+    Uses selectolax's lexbor parser when it is installed, falling back to
+    regular expressions otherwise.
+    
     Args:
         html_content: HTML content to convert
             
@@ -18,21 +33,26 @@ def html_to_text(html_content: Optional[str]) -> str:
     """
     if not html_content:
         return ""
+    
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(html_content)
+        tree.strip_tags(['script', 'style'])
+        return ' '.join(tree.text(separator=' ').split())
         
     # Remove scripts and style elements
-    html_content = re.sub(r'<(script|style).*?</\1>', '', html_content, flags=re.DOTALL)
+    html_content = _SCRIPT_STYLE_RE.sub('', html_content)
     
     # Replace <br>, <p>, <div> with newlines
-    html_content = re.sub(r'<br[^>]*>', '\n', html_content)
-    html_content = re.sub(r'</(p|div|h\d)>', '\n', html_content)
+    html_content = _BR_RE.sub('\n', html_content)
+    html_content = _BLOCK_END_RE.sub('\n', html_content)
     
     # Remove all HTML tags
-    html_content = re.sub(r'<[^>]*>', '', html_content)
+    html_content = _TAG_RE.sub('', html_content)
     
     # Decode HTML entities
     text_content = html.unescape(html_content)
     
-    # Normalize whitespace
-    text_content = re.sub(r'\s+', ' ', text_content).strip()
+    # Normalize whitespace (str.split is faster than a regex here)
+    text_content = ' '.join(text_content.split())
     
     return text_content
\ No newline at end of file